@@ -1,45 +1,274 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, g, stream_with_context
 from flask_migrate import Migrate
 from flask_cors import CORS
-import requests
 import os
+import json
+import base64
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import and_, func, or_
 from dotenv import load_dotenv
-from models import db, UserPreferences, ReformulationHistory, EmailHistory, CorrectionHistory, TranslationHistory
-from openai import OpenAI
-from anthropic import Anthropic
-import google.generativeai as genai
+from models import db, UserPreferences, ReformulationHistory, EmailHistory, CorrectionHistory, TranslationHistory, default_ollama_options, default_routing, upgrade_schema
+from preferences import PreferencesStore
+from providers import ClientRegistry, parse_timeouts
+from engine import GenerationEngine, prompt_eval_stats
+from catalogue import ModelCatalogue, CatalogueError, CREDENTIALS
+from cache import ResponseCache
+from search import HistorySearch
+from database import configure_engine, database_uri, engine_options
+from history_writer import HistoryWriter
+from retention import RetentionJob, enable_incremental_vacuum
+from scheduler import Overloaded, ProviderScheduler, parse_limits
+from resilience import CircuitBreaker, RetryPolicy
+import metrics
+import prompts
+import startup
+import tracing
+from chunking import split_text
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-app.secret_key = os.urandom(24)
-
-# Use SQLite for development
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///reformulator.db'
+# Shared by every worker and kept across restarts
+app.secret_key = startup.secret_key(os.getenv(
+    'SECRET_KEY_FILE', os.path.join(app.instance_path, 'secret_key')))
+
+# SQLite by default, any SQLAlchemy URL through SQLALCHEMY_DATABASE_URI
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 migrate = Migrate(app, db)
 
+history_search = HistorySearch()
+
 with app.app_context():
-    db.create_all()
-
-def reload_env_config():
-    load_dotenv(override=True)
-    preferences = UserPreferences.get_or_create()
-    preferences.ollama_url = os.getenv('OLLAMA_URL', preferences.ollama_url)
-    preferences.openai_api_key = os.getenv('OPENAI_API_KEY', preferences.openai_api_key)
-    preferences.anthropic_api_key = os.getenv('ANTHROPIC_API_KEY', preferences.anthropic_api_key)
-    preferences.google_api_key = os.getenv('GOOGLE_API_KEY', preferences.google_api_key)
-    preferences.groq_api_key = os.getenv('GROQ_API_KEY', preferences.groq_api_key)
-    preferences.deepseek_api_key = os.getenv('DEEPSEEK_API_KEY', preferences.deepseek_api_key)
-    preferences.openrouter_api_key = os.getenv('OPENROUTER_API_KEY', preferences.openrouter_api_key)
-    db.session.commit()
-    return preferences
+    configure_engine(db.engine)
+    # Workers starting together upgrade the schema one after the other
+    with startup.exclusive(os.path.join(app.instance_path, 'migrate.lock')):
+        db.create_all()
+        upgrade_schema()
+        history_search.setup(db.engine)
+
+preferences_store = PreferencesStore(
+    check_interval=float(os.getenv('PREFERENCES_CHECK_INTERVAL', '2')))
+
+clients = ClientRegistry(
+    max_connections=int(os.getenv('PROVIDER_MAX_CONNECTIONS', '20')),
+    max_keepalive_connections=int(os.getenv('PROVIDER_MAX_KEEPALIVE', '10')),
+    keepalive_expiry=float(os.getenv('PROVIDER_KEEPALIVE_EXPIRY', '60')),
+    connect_timeout=float(os.getenv('PROVIDER_CONNECT_TIMEOUT', '10')),
+    read_timeout=float(os.getenv('PROVIDER_READ_TIMEOUT', '120')),
+    # Local models on CPU can take minutes for long texts
+    timeouts={'ollama': (5.0, 600.0),
+              **parse_timeouts(os.getenv('PROVIDER_TIMEOUTS'))})
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', '86400')),
+    path=os.getenv('RESPONSE_CACHE_PATH') or None,
+    endpoints=[e.strip() for e in os.getenv(
+        'RESPONSE_CACHE_ENDPOINTS', 'translate,correct').split(',') if e.strip()])
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '1000'))
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '1500'))
+CHUNK_CONCURRENCY = int(os.getenv('CHUNK_CONCURRENCY', '4'))
+scheduler = ProviderScheduler(
+    limits={'ollama': 2, **parse_limits(os.getenv('PROVIDER_CONCURRENCY'))},
+    default_limit=int(os.getenv('PROVIDER_CONCURRENCY_DEFAULT', '8')),
+    max_queue=int(os.getenv('PROVIDER_QUEUE_SIZE', '32')),
+    queue_timeout=float(os.getenv('PROVIDER_QUEUE_TIMEOUT', '60')))
+circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30')))
+engine = GenerationEngine(
+    clients, cache=response_cache,
+    max_batch_workers=BATCH_CONCURRENCY,
+    scheduler=scheduler,
+    retry=RetryPolicy(
+        retries=int(os.getenv('PROVIDER_RETRIES', '2')),
+        base_delay=float(os.getenv('PROVIDER_RETRY_BASE_DELAY', '0.5')),
+        max_delay=float(os.getenv('PROVIDER_RETRY_MAX_DELAY', '8'))),
+    breaker=circuit_breaker)
+catalogue = ModelCatalogue(
+    clients,
+    ttl=float(os.getenv('MODEL_CATALOGUE_TTL', '600')),
+    stale_ttl=float(os.getenv('MODEL_CATALOGUE_STALE_TTL', '86400')),
+    timeout=float(os.getenv('MODEL_CATALOGUE_TIMEOUT', '10')))
+history_writer = HistoryWriter(
+    app,
+    max_queue=int(os.getenv('HISTORY_QUEUE_SIZE', '1000')),
+    batch_size=int(os.getenv('HISTORY_BATCH_SIZE', '50')),
+    flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', '0.5')),
+    enabled=os.getenv('HISTORY_WRITE_BEHIND', '1') != '0')
+retention_job = RetentionJob(
+    app,
+    max_age_days=float(os.getenv('HISTORY_MAX_AGE_DAYS', '0')) or None,
+    max_rows=int(os.getenv('HISTORY_MAX_ROWS', '0')) or None,
+    archive_dir=os.getenv('HISTORY_ARCHIVE_DIR', 'history_archive'),
+    interval=float(os.getenv('HISTORY_RETENTION_INTERVAL', '3600')),
+    chunk_size=int(os.getenv('HISTORY_RETENTION_CHUNK', '500')),
+    search=history_search)
+tracer = tracing.Tracer(
+    enabled=os.getenv('TRACING', '0') == '1',
+    path=os.getenv('TRACING_FILE') or None,
+    server_timing=os.getenv('TRACING_SERVER_TIMING', '1') != '0',
+    sample_rate=float(os.getenv('TRACING_SAMPLE_RATE', '1')))
+
+metrics.registry.collect(
+    'reformulator_provider_in_flight', 'Provider calls holding a slot.',
+    ('provider', 'model'),
+    lambda: [((s['provider'], s['model']), s['in_flight'])
+             for s in scheduler.stats()])
+metrics.registry.collect(
+    'reformulator_provider_queued', 'Provider calls waiting for a slot.',
+    ('provider', 'model'),
+    lambda: [((s['provider'], s['model']), s['queued'])
+             for s in scheduler.stats()])
+metrics.registry.collect(
+    'reformulator_circuit_open',
+    'Whether the provider circuit is open (1) or closed (0).',
+    ('provider',),
+    lambda: [((provider,), int(circuit['state'] != 'closed'))
+             for provider, circuit in circuit_breaker.stats().items()])
+metrics.registry.collect(
+    'reformulator_response_cache_lookups_total', 'Response cache lookups.',
+    ('result',),
+    lambda: [(('hit',), response_cache.hits), (('miss',), response_cache.misses)],
+    type='counter')
+metrics.registry.collect(
+    'reformulator_history_queue_size', 'History rows waiting to be written.',
+    (), lambda: [((), history_writer.stats()['queued'])])
+
+def preload_ollama_model():
+    """Load the configured Ollama model in the background to avoid a cold start."""
+    def run():
+        with app.app_context():
+            preferences = preferences_store.current()
+        if (preferences.current_provider != 'ollama'
+                or not preferences.ollama_options.get('preload')):
+            return
+        try:
+            engine.backend(preferences, 'ollama').preload()
+        except Exception as e:
+            print(f"Error preloading Ollama model: {str(e)}")
+    threading.Thread(target=run, daemon=True).start()
+
+@app.cli.command('enable-incremental-vacuum')
+def enable_incremental_vacuum_command():
+    """Switch the database to incremental vacuum (run with the app stopped)."""
+    if enable_incremental_vacuum():
+        print("Incremental vacuum enabled")
+    else:
+        print("Incremental vacuum already enabled (or not a SQLite database)")
+
+def start_background_tasks():
+    """Start the threads of this process (in each worker when pre-forking)."""
+    retention_job.start()
+    preload_ollama_model()
+
+def after_fork():
+    """Called in each worker forked from a master that imported the app."""
+    with app.app_context():
+        # Connections opened by the master must not be shared with it
+        db.engine.dispose(close=False)
+    start_background_tasks()
+
+# Under gunicorn --preload, threads started in the master would not survive
+# the fork: gunicorn.conf.py starts them in each worker instead
+if os.getenv('SERVER_PREFORK') != '1':
+    start_background_tasks()
 
 @app.before_request
-def before_request():
-    reload_env_config()
+def start_request_timer():
+    g.request_started = time.monotonic()
+    g.trace = tracer.start(f"{request.method} {request.path}",
+                           **{'http.method': request.method,
+                              'http.route': request.endpoint})
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request once its response, streamed or not, is sent."""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    method = request.method
+    status = str(response.status_code)
+    trace = g.get('trace')
+    if trace is not None and tracer.server_timing:
+        # Stages still running (e.g. a stream) are only in the exported trace
+        response.headers['Server-Timing'] = trace.trace.server_timing()
+
+    def observe():
+        metrics.http_requests.inc(endpoint=endpoint, method=method,
+                                  status=status)
+        metrics.http_duration.observe(time.monotonic() - started,
+                                      endpoint=endpoint, method=method)
+        if trace is not None:
+            tracer.finish(trace, **{'http.status_code': response.status_code})
+    response.call_on_close(observe)
+    return response
+
+def get_preferences():
+    """Return the preferences snapshot, pinned for the whole request."""
+    if 'preferences' not in g:
+        with tracing.span('preferences'):
+            g.preferences = preferences_store.current()
+    return g.preferences
+
+def wants_stream():
+    """True when the client asked for Server-Sent Events instead of JSON."""
+    return (request.args.get('stream') == '1'
+            or request.accept_mimetypes.best == 'text/event-stream')
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def overloaded_response(error):
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def stream_generation(tokens, on_complete):
+    """Stream ``tokens`` as SSE, then hand the full text to ``on_complete``.
+
+    The first token is awaited before answering, so that a full provider
+    queue is still reported as a 503 rather than inside the stream.
+    """
+    try:
+        first = [next(tokens)]
+    except StopIteration:
+        first = []
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        first = e
+
+    def events():
+        chunks = []
+        try:
+            if isinstance(first, Exception):
+                raise first
+            for token in itertools.chain(first, tokens):
+                chunks.append(token)
+                yield sse_event({"token": token})
+            response_text = ''.join(chunks)
+            on_complete(response_text)
+            yield sse_event({"text": response_text}, event='done')
+        except Exception as e:
+            print(f"Error while streaming: {str(e)}")
+            yield sse_event({"error": str(e)}, event='error')
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
 
 @app.errorhandler(404)
 @app.errorhandler(500)
@@ -49,11 +278,13 @@ def handle_error(error):
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     try:
-        preferences = reload_env_config()
+        preferences = get_preferences()
         return jsonify({
             "provider": preferences.current_provider,
             "settings": {
                 "ollama_url": preferences.ollama_url,
+                "ollama_options": preferences.ollama_options,
+                "routing": preferences.routing,
                 "openai_api_key": preferences.openai_api_key,
                 "anthropic_api_key": preferences.anthropic_api_key,
                 "google_api_key": preferences.google_api_key,
@@ -75,249 +306,196 @@ def get_settings():
 @app.route('/api/status')
 def check_status():
     try:
-        preferences = reload_env_config()
+        preferences = get_preferences()
         provider = preferences.current_provider
         return jsonify({"status": "connected", "provider": provider})
     except Exception as e:
         print(f"Unexpected error checking status: {str(e)}")
         return jsonify({"status": "error", "error": str(e)}), 500
 
-@app.route('/api/models/gemini')
-def get_gemini_models():
-    try:
-        preferences = reload_env_config()
-        if not preferences.google_api_key:
-            return jsonify({"error": "Clé API Google non configurée"}), 401
-        try:
-            genai.configure(api_key=preferences.google_api_key)
-            models = genai.list_models()
-            filtered_models = [{
-                "id": model.name,
-                "name": model.display_name
-            } for model in models if 'gemini' in model.name]
-            return jsonify({"models": filtered_models})
-        except Exception as e:
-            print(f"Erreur lors de la récupération des modèles Gemini : {str(e)}")
-            return jsonify({"error": f"Erreur de l'API Gemini : {str(e)}"}), 500
-    except Exception as e:
-        print(f"Erreur dans get_gemini_models : {str(e)}")
-        return jsonify({"error": str(e)}), 500
+def models_response(payload):
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
 
-@app.route('/api/models/anthropic')
-def get_anthropic_models():
+@app.route('/api/models/<provider>')
+def get_provider_models(provider):
     try:
-        preferences = reload_env_config()
-        if not preferences.anthropic_api_key:
-            return jsonify({"error": "Clé API Anthropic non configurée"}), 401
+        preferences = get_preferences()
         try:
-            client = Anthropic(api_key=preferences.anthropic_api_key)
-            models = [{
-                "id": "claude-3-opus-20240229",
-                "name": "Claude 3 Opus"
-            }, {
-                "id": "claude-3-sonnet-20240229",
-                "name": "Claude 3 Sonnet"
-            }, {
-                "id": "claude-3-haiku-20240307",
-                "name": "Claude 3 Haiku"
-            }, {
-                "id": "claude-2.1",
-                "name": "Claude 2.1"
-            }, {
-                "id": "claude-2.0",
-                "name": "Claude 2.0"
-            }, {
-                "id": "claude-instant-1.2",
-                "name": "Claude Instant 1.2"
-            }]
-            return jsonify({"models": models})
-        except Exception as e:
-            print(f"Erreur lors de la récupération des modèles Anthropic : {str(e)}")
-            return jsonify({"error": f"Erreur de l'API Anthropic : {str(e)}"}), 500
+            if provider == 'ollama' and request.args.get('url'):
+                credential = request.args.get('url')
+            else:
+                credential = catalogue.credential(provider, preferences)
+            models = catalogue.get(provider, credential,
+                                   refresh=request.args.get('refresh') == '1')
+        except CatalogueError as e:
+            print(f"Error fetching {provider} models: {str(e)}")
+            return jsonify({"error": str(e)}), e.status
+        return models_response({"models": models})
     except Exception as e:
-        print(f"Erreur dans get_anthropic_models : {str(e)}")
+        print(f"Error in get_provider_models: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/models/groq')
-def get_groq_models():
+@app.route('/api/models')
+def get_all_models():
+    """Model lists of every configured provider, fetched concurrently."""
     try:
-        preferences = reload_env_config()
-        if not preferences.groq_api_key:
-            return jsonify({"error": "Groq API key not configured"}), 401
-        try:
-            response = requests.get(
-                "https://api.groq.com/openai/v1/models",
-                headers={"Authorization": f"Bearer {preferences.groq_api_key}"})
-            if response.status_code != 200:
-                return jsonify({"error": response.text}), response.status_code
-            data = response.json()
-            return jsonify({
-                "models": [{
-                    "id": model["id"],
-                    "name": model["id"]
-                } for model in data["data"]]
-            })
-        except Exception as e:
-            return jsonify({"error": f"Failed to fetch Groq models: {str(e)}"}), 500
+        preferences = get_preferences()
+
+        def fetch(provider):
+            try:
+                credential = catalogue.credential(provider, preferences)
+                return provider, {"models": catalogue.get(provider, credential)}
+            except CatalogueError as e:
+                return provider, {"error": str(e), "status": e.status}
+
+        with ThreadPoolExecutor(max_workers=len(CREDENTIALS)) as executor:
+            providers = dict(executor.map(fetch, CREDENTIALS))
+        return models_response({"providers": providers})
     except Exception as e:
+        print(f"Error in get_all_models: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/models/deepseek')
-def get_deepseek_models():
+@app.route('/')
+def index():
+    # History is loaded lazily by the page through /api/history/<type>
+    preferences = get_preferences()
+    return render_template(
+        'index.html',
+        system_prompt=preferences.system_prompt,
+        translation_prompt=preferences.translation_prompt,
+        email_prompt=preferences.email_prompt,
+        correction_prompt=preferences.correction_prompt)
+
+# history type -> (model, column used for the preview of compact rows)
+HISTORY_TYPES = {
+    'reformulation': (ReformulationHistory, ReformulationHistory.reformulated_text),
+    'email': (EmailHistory, EmailHistory.generated_email),
+    'correction': (CorrectionHistory, CorrectionHistory.corrected_text),
+    'translation': (TranslationHistory, TranslationHistory.translated_text),
+}
+HISTORY_PREVIEW_LENGTH = 160
+
+def encode_cursor(entry):
+    raw = f"{entry.created_at.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
     try:
-        preferences = reload_env_config()
-        if not preferences.deepseek_api_key:
-            return jsonify({"error": "deepseek API key not configured"}), 401
-        try:
-            response = requests.get(
-                "https://api.deepseek.com/v1/models",
-                headers={"Authorization": f"Bearer {preferences.deepseek_api_key}"})
-            if response.status_code != 200:
-                return jsonify({"error": response.text}), response.status_code
-            data = response.json()
-            return jsonify({
-                "models": [{
-                    "id": model["id"],
-                    "name": model["id"]
-                } for model in data["data"]]
-            })
-        except Exception as e:
-            return jsonify({"error": f"Failed to fetch deepseek models: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-## Display ALL free models from OpenRouter.
-# @app.route('/api/models/openrouter')
-# def get_openrouter_models():
-#     try:
-#         preferences = reload_env_config()
-#         if not preferences.openrouter_api_key:
-#             return jsonify({"error": "openrouter API key not configured"}), 401
-#         try:
-#             response = requests.get(
-#                 "https://openrouter.ai/api/v1/models",
-#                 headers={"Authorization": f"Bearer {preferences.openrouter_api_key}"})
-#             if response.status_code != 200:
-#                 return jsonify({"error": response.text}), response.status_code
-#             data = response.json()
-#             return jsonify({
-#                 "models": [{
-#                     "id": model["id"],
-#                     "name": model["id"]
-#                 } for model in data["data"]]
-#             })
-#         except Exception as e:
-#             return jsonify({"error": f"Failed to fetch openrouter models: {str(e)}"}), 500
-#     except Exception as e:
-#         return jsonify({"error": str(e)}), 500
-
-# Display ONLY free models from OpenRouter.
-@app.route('/api/models/openrouter')
-def get_openrouter_models():
+        created_at, entry_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+@app.route('/api/history/<history_type>')
+def get_history(history_type):
+    """Newest-first history page using keyset pagination.
+
+    Rows are compact (metadata plus a short preview, the text columns are not
+    loaded) unless ``full=1`` is passed. ``next_cursor`` is ``None`` on the
+    last page.
+    """
+    if history_type not in HISTORY_TYPES:
+        return jsonify({"error": f"Unknown history type: {history_type}"}), 404
+    model, preview_column = HISTORY_TYPES[history_type]
     try:
-        preferences = reload_env_config()
-        if not preferences.openrouter_api_key:
-            return jsonify({"error": "openrouter API key not configured"}), 401
         try:
-            response = requests.get(
-                "https://openrouter.ai/api/v1/models",
-                headers={"Authorization": f"Bearer {preferences.openrouter_api_key}"}
-            )
-            if response.status_code != 200:
-                return jsonify({"error": response.text}), response.status_code
-            data = response.json()
-
-            # Filtrer les modèles dont l'ID se termine par ":free"
-            free_models = [
-                {
-                    "id": model["id"],
-                    "nom": "free"  # Définir le nom sur "free"
-                }
-                for model in data.get("data", [])
-                if model["id"].endswith(":free")
-            ]
-
-            return jsonify({"models": free_models})
-        except Exception as e:
-            return jsonify({"error": f"Failed to fetch openrouter models: {str(e)}"}), 500
+            limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        try:
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        full = request.args.get('full') == '1'
+
+        if full:
+            query = db.session.query(model)
+        else:
+            columns = [column for column in model.__table__.columns
+                       if not isinstance(column.type, db.Text)]
+            query = db.session.query(
+                *columns,
+                func.substr(preview_column, 1,
+                            HISTORY_PREVIEW_LENGTH).label('preview'))
+        if cursor:
+            created_at, entry_id = cursor
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < entry_id)))
+        rows = query.order_by(model.created_at.desc(),
+                              model.id.desc()).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if full:
+            items = [row.to_dict() for row in rows]
+        else:
+            items = [dict(row._mapping,
+                          created_at=row.created_at.isoformat())
+                     for row in rows]
+        return jsonify({
+            "items": items,
+            "next_cursor": encode_cursor(rows[-1]) if has_more else None
+        })
     except Exception as e:
+        print(f"Error in get_history: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/models/openai')
-def get_openai_models():
+@app.route('/api/history/<history_type>/<int:entry_id>')
+def get_history_entry(history_type, entry_id):
+    """One history row with its full texts (the pages only carry a preview)."""
+    if history_type not in HISTORY_TYPES:
+        return jsonify({"error": f"Unknown history type: {history_type}"}), 404
+    model, _ = HISTORY_TYPES[history_type]
     try:
-        preferences = reload_env_config()
-        if not preferences.openai_api_key:
-            return jsonify({"error": "Clé API OpenAI non configurée"}), 401
-        try:
-            client = OpenAI(api_key=preferences.openai_api_key)
-            response = client.models.list()
-            models = response.data
-            filtered_models = [{
-                "id": model.id,
-                "name": model.id
-            } for model in models if 'gpt' in model.id]
-            return jsonify({"models": filtered_models})
-        except Exception as e:
-            print(f"Erreur lors de la récupération des modèles OpenAI : {str(e)}")
-            return jsonify({"error": f"Erreur de l'API OpenAI : {str(e)}"}), 500
+        entry = db.session.get(model, entry_id)
+        if entry is None:
+            return jsonify({"error": "History entry not found"}), 404
+        return jsonify(entry.to_dict())
     except Exception as e:
-        print(f"Erreur dans get_openai_models : {str(e)}")
+        print(f"Error in get_history_entry: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/models/ollama')
-def get_ollama_models():
+@app.route('/api/history/search')
+def search_history():
+    """Full-text search over all history types, best match first.
+
+    ``q`` is the search text, ``type`` restricts it to one history type.
+    Snippets are HTML-escaped with the matches wrapped in ``<mark>``.
+    """
+    if not history_search.available:
+        return jsonify({"error": "Full-text search is not available"}), 501
+    query = request.args.get('q', '').strip()
+    history_type = request.args.get('type') or None
+    if history_type and history_type not in HISTORY_TYPES:
+        return jsonify({"error": f"Unknown history type: {history_type}"}), 404
     try:
-        preferences = reload_env_config()
-        url = request.args.get('url', preferences.ollama_url)
-        if not url:
-            return jsonify({"error": "Ollama URL not configured"}), 401
-        try:
-            response = requests.get(f"{url}/api/tags", timeout=5)
-            if response.status_code != 200:
-                return jsonify({"error": "Failed to fetch Ollama models"}), response.status_code
-            data = response.json()
-            models = [{
-                "id": model["name"],
-                "name": model["name"]
-            } for model in data["models"]]
-            return jsonify({"models": models})
-        except requests.exceptions.RequestException as e:
-            print(f"Error in get_ollama_models: {str(e)}")
-            return jsonify({"error": f"Ollama connection error: {str(e)}"}), 500
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or offset"}), 400
+    try:
+        results, has_more = history_search.search(
+            db.session, query, history_type, limit, offset)
+        return jsonify({
+            "items": results,
+            "next_offset": offset + limit if has_more else None
+        })
     except Exception as e:
-        print(f"Error in get_ollama_models: {str(e)}")
+        print(f"Error in search_history: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/')
-def index():
-    preferences = reload_env_config()
-    reformulation_history = ReformulationHistory.query.order_by(
-        ReformulationHistory.created_at.desc()).limit(10).all()
-    email_history = EmailHistory.query.order_by(
-        EmailHistory.created_at.desc()).limit(10).all()
-    correction_history = CorrectionHistory.query.order_by(
-        CorrectionHistory.created_at.desc()).limit(10).all()
-    translation_history = TranslationHistory.query.order_by(
-        TranslationHistory.created_at.desc()).limit(10).all()
-    return render_template(
-        'index.html',
-        system_prompt=preferences.system_prompt,
-        translation_prompt=preferences.translation_prompt,
-        email_prompt=preferences.email_prompt,
-        correction_prompt=preferences.correction_prompt,
-        reformulation_history=[h.to_dict() for h in reformulation_history],
-        email_history=[h.to_dict() for h in email_history],
-        correction_history=[h.to_dict() for h in correction_history],
-        translation_history=[h.to_dict() for h in translation_history])
-
 @app.route('/api/settings', methods=['POST'])
 def update_settings():
     try:
         data = request.get_json()
         if data is None:
             return jsonify({"error": "Invalid request: No JSON data"}), 400
-        preferences = reload_env_config()
+        preferences = UserPreferences.get_or_create()
         provider = data.get('provider', 'ollama')
         settings = data.get('settings', {})
         preferences.current_provider = provider
@@ -326,6 +504,11 @@ def update_settings():
                 preferences.ollama_url = url
             if model := settings.get('model'):
                 preferences.ollama_model = model
+            if isinstance(options := settings.get('options'), dict):
+                ollama_options = default_ollama_options()
+                ollama_options.update(preferences.ollama_options or {})
+                ollama_options.update(options)
+                preferences.ollama_options = ollama_options
         elif provider == 'openai':
             if api_key := settings.get('apiKey'):
                 preferences.openai_api_key = api_key
@@ -357,626 +540,348 @@ def update_settings():
             if model := settings.get('model'):
                 preferences.gemini_model = model
         db.session.commit()
+        preferences_store.invalidate()
+        if settings.get('apiKey'):
+            clients.evict(provider)
+            catalogue.invalidate(provider)
+        if provider == 'ollama':
+            preload_ollama_model()
         return jsonify({"status": "success"})
     except Exception as e:
         print(f"Error in update_settings: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reformulate', methods=['POST'])
-def reformulate():
+@app.route('/api/settings/routing', methods=['POST'])
+def update_routing():
+    """Store the fallback chains and hedging settings.
+
+    Expects ``{"fallbacks": {"default": [...], "translate": [...]},
+    "hedge": {"enabled": true, ...}}``; omitted keys are left unchanged.
+    """
     try:
         data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-        preferences = reload_env_config()
-        provider = preferences.current_provider
-        text = data.get('text')
-        context = data.get('context', '')
-        tone = data.get('tone', 'Professionnel')  # Default to 'Professionnel' if not specified
-        format = data.get('format', 'Paragraphe')
-        length = data.get('length', 'Moyen')
-        use_emojis = data.get('use_emojis', False)  # Get emoji preference
-        
-        if not text:
-            return jsonify({"error": "No text provided"}), 400
-
-        # Construction d'un prompt plus détaillé avec meilleure intégration du contexte
-        preferences = UserPreferences.get_or_create()
-        reformulation_prefs = preferences.reformulation_preferences
-
-        style_preservation = reformulation_prefs.get('style_preservation', 0.7)
-        context_importance = reformulation_prefs.get('context_importance', 0.8)
-        advanced_options = reformulation_prefs.get('advanced_options', {})
-
-        email_format_instructions = """
-Structure OBLIGATOIRE pour le format mail:
-1. Ligne "Objet: [sujet]" (OBLIGATOIRE en début d'email)
-2. Formule de salutation appropriée et personnalisée
-3. Corps du message structuré en paragraphes clairs
-4. Formule de politesse adaptée au contexte
-5. Signature professionnelle
-
-Règles supplémentaires format mail:
-- L'objet doit être concis et pertinent
-- La salutation doit être adaptée au destinataire
-- Les paragraphes doivent être courts et bien espacés
-- La formule de politesse doit correspondre au ton choisi
-- La signature doit inclure les informations essentielles
-""" if format.lower() == 'mail' else ''
-
-        formatted_prompt = f"""INSTRUCTIONS DE REFORMULATION :
-Ce message est une réponse à un email reçu.
-
-===EMAIL REÇU (NE PAS REFORMULER)=== 
-{context}
-
-===RÉPONSE À REFORMULER=== 
-{text}
-
-RÈGLES STRICTES :
-1. REFORMULER UNIQUEMENT le texte sous "===RÉPONSE À REFORMULER==="
-2. NE PAS reformuler ni inclure l'email reçu
-3. Produire une réponse cohérente avec l'email reçu
-4. {" AJOUTER des emojis pertinents et appropriés au contexte" if use_emojis else "NE PAS ajouter d'emojis"}
-
-Paramètres de reformulation :
-- Ton désiré : {tone} (IMPORTANT: Adapter strictement le ton selon cette valeur)
-- Format souhaité : {format}
-- Longueur cible : {length}
-- Emojis : {"Oui, ajouter des emojis pertinents" if use_emojis else "Non"}
-
-Instructions spécifiques pour le ton {tone}:
-- Si Professionnel : langage soutenu, formel et courtois {", emojis professionnels uniquement" if use_emojis else ""}
-- Si Informatif : style clair, précis et factuel {", emojis informatifs et pédagogiques" if use_emojis else ""}
-- Si Décontracté : style plus relâché, familier tout en restant poli {", emojis expressifs et amicaux" if use_emojis else ""}
-
-{email_format_instructions}"""
-
-        try:
-            response_text = None
-            if provider == 'ollama':
-                response = requests.post(
-                    f"{preferences.ollama_url}/api/generate",
-                    json={
-                        'model': preferences.ollama_model,
-                        'prompt': formatted_prompt,
-                        'system': preferences.system_prompt,
-                        'stream': False
-                    })
-                if response.status_code == 200:
-                    response_text = response.json().get('response', '')
-            elif provider == 'openai':
-                client = OpenAI(api_key=preferences.openai_api_key)
-                response = client.chat.completions.create(
-                    model=preferences.openai_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.system_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'anthropic':
-                client = Anthropic(api_key=preferences.anthropic_api_key)
-                message = client.messages.create(
-                    model=preferences.anthropic_model,
-                    system=preferences.system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = message.content[0].text
-            elif provider == 'groq':
-                client = OpenAI(
-                    api_key=preferences.groq_api_key,
-                    base_url="https://api.groq.com/openai/v1")
-                response = client.chat.completions.create(
-                    model=preferences.groq_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.system_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'deepseek':
-                client = OpenAI(
-                    api_key=preferences.deepseek_api_key,
-                    base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(
-                    model=preferences.deepseek_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.system_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'openrouter':
-                client = OpenAI(
-                    api_key=preferences.openrouter_api_key,
-                    base_url="https://openrouter.ai/api/v1")
-                response = client.chat.completions.create(
-                    model=preferences.openrouter_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.system_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'gemini':
-                genai.configure(api_key=preferences.google_api_key)
-                model = genai.GenerativeModel(preferences.gemini_model)
-                response = model.generate_content([{
-                    "role": "user",
-                    "parts": [preferences.system_prompt]
-                }, {
-                    "role": "user",
-                    "parts": [formatted_prompt]
-                }])
-                response_text = response.text
-
-            if not response_text:
-                raise Exception(f"No response from {provider}")
-
-            history = ReformulationHistory(
-                original_text=text,
-                context=context,
-                reformulated_text=response_text,
-                tone=tone,
-                format=format,
-                length=length)
-            db.session.add(history)
-            db.session.commit()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid request: No JSON data"}), 400
+        fallbacks = data.get('fallbacks', {})
+        if not isinstance(fallbacks, dict) or not all(
+                isinstance(chain, list) and all(name in CREDENTIALS for name in chain)
+                for chain in fallbacks.values()):
+            return jsonify({"error": "fallbacks must map operations to lists of providers"}), 400
+        hedge = data.get('hedge', {})
+        if not isinstance(hedge, dict):
+            return jsonify({"error": "hedge must be an object"}), 400
 
-            return jsonify({"text": response_text})
-        except Exception as e:
-            return jsonify({"error": f"Error reformulating text: {str(e)}"}), 500
+        preferences = UserPreferences.get_or_create()
+        routing = default_routing()
+        routing.update(preferences.routing or {})
+        routing['fallbacks'] = {**routing['fallbacks'], **fallbacks}
+        routing['hedge'] = {**routing['hedge'], **hedge}
+        preferences.routing = routing
+        db.session.commit()
+        preferences_store.invalidate()
+        return jsonify({"status": "success", "routing": routing})
     except Exception as e:
+        print(f"Error in update_routing: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/correct', methods=['POST'])
-def correct_text():
+def require_strings(data, *names):
+    """Raise ``ValueError`` unless each of ``names`` is missing, null or a string."""
+    for name in names:
+        if data.get(name) is not None and not isinstance(data[name], str):
+            raise ValueError(f"{name} must be a string")
+
+def prepare_reformulation(preferences, data):
+    """Validate a reformulation request.
+
+    Like the other ``prepare_*`` helpers, returns ``(system, prompt,
+    make_history, build_chunk)`` and raises ``ValueError`` on invalid input.
+    ``build_chunk(text)`` gives the ``(system, prompt)`` pair for one chunk of
+    a long text, or is None for the operations that are not chunked.
+    """
+    require_strings(data, 'text', 'context', 'tone', 'format', 'length')
+    text = data.get('text')
+    context = data.get('context') or ''
+    tone = data.get('tone') or 'Professionnel'  # Default to 'Professionnel' if not specified
+    format = data.get('format') or 'Paragraphe'
+    length = data.get('length') or 'Moyen'
+    use_emojis = bool(data.get('use_emojis', False))  # Get emoji preference
+
+    if not text:
+        raise ValueError("No text provided")
+
+    system, formatted_prompt = prompts.reformulation(
+        preferences, text, context, tone, format, length, use_emojis)
+
+    def make_history(response_text):
+        return ReformulationHistory(
+            original_text=text,
+            context=context,
+            reformulated_text=response_text,
+            tone=tone,
+            format=format,
+            length=length)
+
+    return system, formatted_prompt, make_history, None
+
+def prepare_correction(preferences, data):
+    require_strings(data, 'text')
+    text = data.get('text')
+    options = data.get('options') or {}
+
+    if not text:
+        raise ValueError("Text is required")
+    if not isinstance(options, dict) or not isinstance(
+            options.get('syntax_rules') or {}, dict):
+        raise ValueError("options must be an object")
+
+    system, formatted_prompt = prompts.correction(text, options)
+
+    def make_history(response_text):
+        return CorrectionHistory(
+            original_text=text,
+            corrected_text=response_text,
+            corrections=options
+        )
+
+    def build_chunk(chunk_text):
+        return prompts.correction(chunk_text, options)
+
+    return system, formatted_prompt, make_history, build_chunk
+
+def prepare_translation(preferences, data):
+    require_strings(data, 'text', 'language')
+    text = data.get('text')
+    target_language = data.get('language')
+    if not text or not target_language:
+        raise ValueError("Text and target language are required")
+
+    system, formatted_prompt = prompts.translation(
+        preferences, text, target_language)
+
+    def make_history(response_text):
+        return TranslationHistory(
+            original_text=text,
+            translated_text=response_text,
+            target_language=target_language
+        )
+
+    def build_chunk(chunk_text):
+        return prompts.translation(preferences, chunk_text, target_language)
+
+    return system, formatted_prompt, make_history, build_chunk
+
+def prepare_email(preferences, data):
+    require_strings(data, 'type', 'content', 'sender', 'tone')
+    email_type = data.get('type')
+    content = data.get('content')
+    sender = data.get('sender') or ''
+    if not email_type or not content:
+        raise ValueError("Email type and content are required")
+
+    system, formatted_prompt = prompts.email(
+        preferences, email_type, content, sender,
+        data.get('tone') or 'Professionnel')
+
+    def make_history(response_text):
+        lines = response_text.split('\n')
+        subject = None
+        for line in lines:
+            if line.lower().startswith('objet:'):
+                subject = line[6:].strip()
+                break
+        return EmailHistory(email_type=email_type,
+                            content=content,
+                            sender=sender,
+                            generated_subject=subject,
+                            generated_email=response_text)
+
+    return system, formatted_prompt, make_history, None
+
+def chunked_tokens(operation, preferences, data, chunks, build_chunk):
+    """Process ``chunks`` concurrently and yield the results in order.
+
+    Each result is yielded as soon as it and every chunk before it are done,
+    with the whitespace that separated the chunks in the original text. With
+    synonym suggestions, the per-chunk synonym sections are gathered at the
+    end so that the output keeps the single-call format.
+    """
+    with_synonyms = (operation == 'correct'
+                     and (data.get('options') or {}).get('synonyms'))
+    outputs = engine.batch(
+        preferences, [build_chunk(chunk.text) for chunk in chunks if chunk.text],
+        endpoint=operation, max_workers=CHUNK_CONCURRENCY)
+    synonyms = []
+    if with_synonyms:
+        yield "===TEXTE CORRIGÉ===\n"
+    for chunk in chunks:
+        if not chunk.text:
+            # Leading whitespace of the text: nothing to process
+            yield chunk.separator
+            continue
+        output = next(outputs)
+        if isinstance(output, Exception):
+            raise output
+        if with_synonyms:
+            corrected, _, found = output.partition('===SYNONYMES===')
+            output = corrected.replace('===TEXTE CORRIGÉ===', '')
+            synonyms.append(found.strip())
+        yield output.strip() + chunk.separator
+    if with_synonyms:
+        yield "\n===SYNONYMES===\n" + "\n".join(filter(None, synonyms))
+
+# operation -> (prepare function, error message prefix)
+OPERATIONS = {
+    'reformulate': (prepare_reformulation, "Error reformulating text"),
+    'correct': (prepare_correction, "Error correcting text"),
+    'translate': (prepare_translation, "Translation error"),
+    'generate-email': (prepare_email, "Error generating email"),
+}
+
+def run_generation(operation):
+    prepare, error_prefix = OPERATIONS[operation]
     try:
-        data = request.get_json()
-        if not data:
+        with tracing.span('parse'):
+            data = request.get_json()
+        if not data or not isinstance(data, dict):
             return jsonify({"error": "No data provided"}), 400
-
-        preferences = reload_env_config()
-        provider = preferences.current_provider
-        text = data.get('text')
-        options = data.get('options', {})
-
-        if not text:
-            return jsonify({"error": "Text is required"}), 400
-
-        # Format the prompt with correction options
-        correction_prompt = "Tu es un correcteur de texte professionnel. Corrige le texte suivant en respectant les options sélectionnées:\n"
-        if options.get('grammar'):
-            correction_prompt += "- Correction grammaticale\n"
-        if options.get('spelling'):
-            correction_prompt += "- Correction orthographique\n"
-        if options.get('style'):
-            correction_prompt += "- Amélioration du style\n"
-        if options.get('punctuation'):
-            correction_prompt += "- Correction de la ponctuation\n"
-        if options.get('syntax'):
-            correction_prompt += "- Correction syntaxique avec les règles suivantes:\n"
-            syntax_rules = options.get('syntax_rules', {})
-            if syntax_rules.get('word_order'):
-                correction_prompt += "  • Vérification de l'ordre des mots\n"
-            if syntax_rules.get('subject_verb_agreement'):
-                correction_prompt += "  • Accord sujet-verbe\n"
-            if syntax_rules.get('verb_tense'):
-                correction_prompt += "  • Temps verbaux\n"
-            if syntax_rules.get('gender_number'):
-                correction_prompt += "  • Accord en genre et nombre\n"
-            if syntax_rules.get('relative_pronouns'):
-                correction_prompt += "  • Pronoms relatifs\n"
-
-        if options.get('synonyms'):
-            correction_prompt += """
-Format de réponse avec synonymes:
-===TEXTE CORRIGÉ===
-[Le texte corrigé]
-===SYNONYMES===
-mot1: synonyme1, synonyme2, synonyme3
-mot2: synonyme1, synonyme2, synonyme3"""
+        preferences = get_preferences()
+        try:
+            with tracing.span('prompt'):
+                system, formatted_prompt, make_history, build_chunk = prepare(
+                    preferences, data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def save_history(response_text):
+            with tracing.span('history'):
+                history_writer.submit(make_history(response_text))
+
+        chunks = None
+        if build_chunk is not None:
+            chunks = split_text(data['text'], CHUNK_MAX_TOKENS)
+        if chunks and sum(1 for chunk in chunks if chunk.text) > 1:
+            tokens = chunked_tokens(operation, preferences, data, chunks,
+                                    build_chunk)
+        elif wants_stream():
+            tokens = engine.stream(preferences, system, formatted_prompt,
+                                   endpoint=operation)
         else:
-            correction_prompt += "\nRetourne UNIQUEMENT le texte corrigé, sans aucun autre commentaire."
+            tokens = None
 
-        formatted_prompt = f"Texte à corriger: {text}"
+        if wants_stream():
+            return stream_generation(tokens, save_history)
 
         try:
-            response_text = None
-            if provider == 'ollama':
-                response = requests.post(
-                    f"{preferences.ollama_url}/api/generate",
-                    json={
-                        'model':
-                        preferences.ollama_model,
-                        'prompt':
-                        formatted_prompt,
-                        'system':
-                        correction_prompt +
-                        ("\nVeuillez inclure des suggestions de synonymes."
-                         if options.get('synonyms') else ""),
-                        'stream':
-                        False
-                    })
-                if response.status_code == 200:
-                    response_text = response.json().get('response', '')
-            elif provider == 'openai':
-                client = OpenAI(api_key=preferences.openai_api_key)
-                response = client.chat.completions.create(
-                    model=preferences.openai_model,
-                    messages=[{
-                        "role": "system",
-                        "content": correction_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'anthropic':
-                client = Anthropic(api_key=preferences.anthropic_api_key)
-                message = client.messages.create(
-                    model=preferences.anthropic_model,
-                    system=correction_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = message.content[0].text
-            elif provider == 'groq':
-                client = OpenAI(api_key=preferences.groq_api_key,
-                                base_url="https://api.groq.com/openai/v1")
-                response = client.chat.completions.create(
-                    model=preferences.groq_model,
-                    messages=[{
-                        "role": "system",
-                        "content": correction_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'deepseek':
-                client = OpenAI(api_key=preferences.deepseek_api_key,
-                                base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(
-                    model=preferences.deepseek_model,
-                    messages=[{
-                        "role": "system",
-                        "content": correction_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'openrouter':
-                client = OpenAI(api_key=preferences.openrouter_api_key,
-                                base_url="https://openrouter.ai/api/v1")
-                response = client.chat.completions.create(
-                    model=preferences.openrouter_model,
-                    messages=[{
-                        "role": "system",
-                        "content": correction_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'gemini':
-                genai.configure(api_key=preferences.google_api_key)
-                model = genai.GenerativeModel(preferences.gemini_model)
-                response = model.generate_content([{
-                    "role": "user",
-                    "parts": [correction_prompt]
-                }, {
-                    "role": "user",
-                    "parts": [formatted_prompt]
-                }])
-                response_text = response.text
-
-            if not response_text:
-                raise Exception(f"No response from {provider}")
-
-            history = CorrectionHistory(
-                original_text=text,
-                corrected_text=response_text,
-                corrections=options
-            )
-            db.session.add(history)
-            db.session.commit()
-
+            if tokens is not None:
+                response_text = ''.join(tokens)
+            else:
+                response_text = engine.generate(
+                    preferences, system, formatted_prompt, endpoint=operation)
+            save_history(response_text)
             return jsonify({"text": response_text})
+        except Overloaded as e:
+            return overloaded_response(e)
         except Exception as e:
-            return jsonify({"error": f"Error correcting text: {str(e)}"}), 500
+            return jsonify({"error": f"{error_prefix}: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/reformulate', methods=['POST'])
+def reformulate():
+    return run_generation('reformulate')
+
+@app.route('/api/correct', methods=['POST'])
+def correct_text():
+    return run_generation('correct')
+
 
 @app.route('/api/translate', methods=['POST'])
 def translate():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-        preferences = reload_env_config()
-        provider = preferences.current_provider
-        text = data.get('text')
-        target_language = data.get('language')
-        if not text or not target_language:
-            return jsonify({"error":
-                            "Text and target language are required"}), 400
-        translation_prompt = preferences.translation_prompt.format(
-            target_language=target_language)
-        formatted_prompt = f"Text: {text}"
-        try:
-            response_text = None
-            if provider == 'ollama':
-                response = requests.post(
-                    f"{preferences.ollama_url}/api/generate",
-                    json={
-                        'model': preferences.ollama_model,
-                        'prompt': formatted_prompt,
-                        'system': translation_prompt,
-                        'stream': False
-                    })
-                if response.status_code == 200:
-                    response_text = response.json().get('response', '')
-            elif provider == 'openai':
-                client = OpenAI(api_key=preferences.openai_api_key)
-                response = client.chat.completions.create(
-                    model=preferences.openai_model,
-                    messages=[{
-                        "role": "system",
-                        "content": translation_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'anthropic':
-                client = Anthropic(api_key=preferences.anthropic_api_key)
-                message = client.messages.create(
-                    model=preferences.anthropic_model,
-                    system=translation_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = message.content[0].text
-            elif provider == 'groq':
-                client = OpenAI(api_key=preferences.groq_api_key,
-                                base_url="https://api.groq.com/openai/v1")
-                response = client.chat.completions.create(
-                    model=preferences.groq_model,
-                    messages=[{
-                        "role": "system",
-                        "content": translation_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'deepseek':
-                client = OpenAI(api_key=preferences.deepseek_api_key,
-                                base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(
-                    model=preferences.deepseek_model,
-                    messages=[{
-                        "role": "system",
-                        "content": translation_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'openrouter':
-                client = OpenAI(api_key=preferences.openrouter_api_key,
-                                base_url="https://openrouter.ai/api/v1")
-                response = client.chat.completions.create(
-                    model=preferences.openrouter_model,
-                    messages=[{
-                        "role": "system",
-                        "content": translation_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'gemini':
-                genai.configure(api_key=preferences.google_api_key)
-                model = genai.GenerativeModel(preferences.gemini_model)
-                response = model.generate_content([{
-                    "role":
-                    "user",
-                    "parts": [translation_prompt]
-                }, {
-                    "role": "user",
-                    "parts": [formatted_prompt]
-                }])
-                response_text = response.text
-            if not response_text:
-                raise Exception(f"No response from {provider}")
-            
-            history = TranslationHistory(
-                original_text=text,
-                translated_text=response_text,
-                target_language=target_language
-            )
-            db.session.add(history)
-            db.session.commit()
-            
-            return jsonify({"text": response_text})
-        except Exception as e:
-            return jsonify({"error": f"Translation error: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return run_generation('translate')
 
 
 @app.route('/api/generate-email', methods=['POST'])
 def generate_email():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-        preferences = reload_env_config()
-        provider = preferences.current_provider
-        email_type = data.get('type')
-        content = data.get('content')
-        sender = data.get('sender', '')
-        if not email_type or not content:
-            return jsonify({"error":
-                            "Email type and content are required"}), 400
-        # Enhanced prompt with tone-specific instructions
-        formatted_prompt = f"""Type d'email: {email_type}
-Contenu à inclure: {content}
-Expéditeur: {sender}
-
-Instructions spécifiques:
-- Format: Email professionnel
-- Type spécifique: {email_type}
-- Ton désiré: {data.get('tone', 'Professionnel')} (IMPORTANT: Adapter strictement le ton)
-- Structure: Objet, Salutation, Corps du message, Formule de politesse, Signature
-- Contenu: Développer le contenu en incluant les points importants de "Contenu à inclure"
-- Mise en forme: Paragraphes clairs, concis et espacés. L'objet doit être concis et informatif.
-
-Instructions spécifiques pour le ton {data.get('tone', 'Professionnel')}:
-- Si Professionnel : langage soutenu, formel et courtois
-- Si Informatif : style clair, précis et factuel
-- Si Décontracté : style plus relâché, familier tout en restant poli
-
-Exemple de structure:
-
-Objet: [Sujet clair et concis]
+    return run_generation('generate-email')
 
-Cher/Chère [Nom du destinataire],
 
-[Corps du message, bien structuré en paragraphes]
+@app.route('/api/batch/<operation>', methods=['POST'])
+def batch_generate(operation):
+    """Run one operation over many items with bounded concurrency.
 
-Cordialement,
-
-[Nom de l'expéditeur]
-"""
+    Results keep the order of ``items``; with ``?stream=1`` (or ``Accept:
+    application/x-ndjson``) they are streamed as NDJSON lines as they
+    complete. History rows are queued together once all items are done.
+    """
+    if operation not in OPERATIONS:
+        return jsonify({"error": f"Unknown operation: {operation}"}), 404
+    prepare, _ = OPERATIONS[operation]
+    try:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "A non-empty list of items is required"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error":
+                            f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
         try:
-            response_text = None
-            if provider == 'ollama':
-                response = requests.post(
-                    f"{preferences.ollama_url}/api/generate",
-                    json={
-                        'model': preferences.ollama_model,
-                        'prompt': formatted_prompt,
-                        'system': preferences.email_prompt,
-                        'stream': False
-                    })
-                if response.status_code == 200:
-                    response_text = response.json().get('response', '')
-            elif provider == 'openai':
-                client = OpenAI(api_key=preferences.openai_api_key)
-                response = client.chat.completions.create(
-                    model=preferences.openai_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.email_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'anthropic':
-                client = Anthropic(api_key=preferences.anthropic_api_key)
-                message = client.messages.create(
-                    model=preferences.anthropic_model,
-                    system=preferences.email_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = message.content[0].text
-            elif provider == 'groq':
-                client = OpenAI(api_key=preferences.groq_api_key,
-                                base_url="https://api.groq.com/openai/v1")
-                response = client.chat.completions.create(
-                    model=preferences.groq_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.email_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'deepseek':
-                client = OpenAI(api_key=preferences.deepseek_api_key,
-                                base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(
-                    model=preferences.deepseek_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.email_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'openrouter':
-                client = OpenAI(api_key=preferences.openrouter_api_key,
-                                base_url="https://openrouter.ai/api/v1")
-                response = client.chat.completions.create(
-                    model=preferences.openrouter_model,
-                    messages=[{
-                        "role": "system",
-                        "content": preferences.email_prompt
-                    }, {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }])
-                response_text = response.choices[0].message.content
-            elif provider == 'gemini':
-                genai.configure(api_key=preferences.google_api_key)
-                model = genai.GenerativeModel(preferences.gemini_model)
-                response = model.generate_content([{
-                    "role":
-                    "user",
-                    "parts": [preferences.email_prompt]
-                }, {
-                    "role": "user",
-                    "parts": [formatted_prompt]
-                }])
-                response_text = response.text
-            if not response_text:
-                raise Exception(f"No response from {provider}")
-            lines = response_text.split('\n')
-            subject = None
-            for line in lines:
-                if line.lower().startswith('objet:'):
-                    subject = line[6:].strip()
-                    break
-            history = EmailHistory(email_type=email_type,
-                                   content=content,
-                                   sender=sender,
-                                   generated_subject=subject,
-                                   generated_email=response_text)
-            db.session.add(history)
-            db.session.commit()
-            return jsonify({"text": response_text})
-        except Exception as e:
-            return jsonify({"error": f"Error generating email: {str(e)}"}), 500
+            concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)),
+                                     BATCH_CONCURRENCY))
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({"error": "Invalid concurrency"}), 400
+        preferences = get_preferences()
+
+        jobs = []
+        for item in items:
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Each item must be an object")
+                jobs.append(prepare(preferences, item))
+            except ValueError as e:
+                jobs.append(e)
+
+        def results():
+            valid = [job for job in jobs if not isinstance(job, Exception)]
+            outputs = engine.batch(
+                preferences, [(system, prompt) for system, prompt, _, _ in valid],
+                endpoint=operation, max_workers=concurrency)
+            histories = []
+            for index, job in enumerate(jobs):
+                if isinstance(job, Exception):
+                    yield {"index": index, "error": str(job)}
+                    continue
+                output = next(outputs)
+                if isinstance(output, Exception):
+                    yield {"index": index, "error": str(output)}
+                else:
+                    histories.append(job[2](output))
+                    yield {"index": index, "text": output}
+            if histories:
+                history_writer.submit(*histories)
+
+        if (request.args.get('stream') == '1'
+                or request.accept_mimetypes.best == 'application/x-ndjson'):
+            def lines():
+                try:
+                    for result in results():
+                        yield json.dumps(result) + "\n"
+                except Exception as e:
+                    print(f"Error in batch_generate: {str(e)}")
+                    yield json.dumps({"error": str(e)}) + "\n"
+            return Response(stream_with_context(lines()),
+                            mimetype='application/x-ndjson')
+
+        return jsonify({"results": list(results())})
     except Exception as e:
+        print(f"Error in batch_generate: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/history/reset', methods=['POST'])
 def reset_history():
     try:
+        # Rows still queued would otherwise reappear after the reset
+        history_writer.flush()
         ReformulationHistory.query.delete()
         EmailHistory.query.delete()
         CorrectionHistory.query.delete()
@@ -984,4 +889,48 @@ def reset_history():
         db.session.commit()
         return jsonify({"status": "success"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/history/retention')
+def get_history_retention():
+    return jsonify({
+        "enabled": retention_job.enabled,
+        "max_age_days": retention_job.max_age_days,
+        "max_rows": retention_job.max_rows,
+        "last_run": retention_job.last_run
+    })
+
+
+@app.route('/api/history/writer/stats')
+def get_history_writer_stats():
+    return jsonify(history_writer.stats())
+
+
+@app.route('/api/scheduler/stats')
+def get_scheduler_stats():
+    return jsonify(scheduler.stats())
+
+
+@app.route('/api/providers/health')
+def get_providers_health():
+    return jsonify({
+        "circuits": circuit_breaker.stats(),
+        "latency": engine.latency.stats()
+    })
+
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@app.route('/api/ollama/stats')
+def get_ollama_stats():
+    return jsonify(prompt_eval_stats.stats())
+
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.registry.render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
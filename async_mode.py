@@ -0,0 +1,44 @@
+"""Cooperative (gevent) execution mode for I/O-bound provider calls.
+
+Provider calls spend nearly all of their time waiting on the network. With
+``ASYNC_MODE=gevent`` the standard library is monkey-patched so that every
+blocking socket call (``requests``, ``httpx``, the provider SDKs) yields to
+other requests, letting one process serve hundreds of in-flight generations
+instead of one per thread.
+
+``enable()`` must run before anything imports ``socket``, ``ssl`` or
+``requests``, i.e. before ``app`` is imported.
+"""
+import os
+
+ASYNC_MODE = os.getenv('ASYNC_MODE', '').lower()
+
+
+def is_enabled():
+    return ASYNC_MODE == 'gevent'
+
+
+def enable():
+    """Monkey-patch the process for gevent when ``ASYNC_MODE=gevent``."""
+    if not is_enabled():
+        return False
+    from gevent import monkey
+    monkey.patch_all()
+    init_grpc()
+    return True
+
+
+def init_grpc():
+    """The Gemini SDK talks gRPC, which needs its own gevent integration."""
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
+
+
+def serve(app, host, port):
+    """Serve ``app`` on gevent's WSGI server, one greenlet per request."""
+    from gevent.pywsgi import WSGIServer
+    print(f"Serving on {host}:{port} (gevent)")
+    WSGIServer((host, port), app).serve_forever()
@@ -0,0 +1,103 @@
+"""Randomized checks of the chunked generation path.
+
+``split_text`` must give back the original text, layout included, when its
+chunks are joined with their separators, whatever the text and budget. The
+chunked ``/api/correct`` and ``/api/translate`` paths are then exercised
+against the mock provider with the same bodies as the single-call path,
+``"options": null`` included:
+
+    python -m bench.check_chunking --texts 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from bench.mock_llm import MockLLM
+from chunking import split_text
+
+# Words, sentence ends and every kind of whitespace the splitter cuts on
+FRAGMENTS = ('mot', 'Phrase', 'é', 'x' * 40, '.', '!', '?', '…', ';', ':',
+             ' ', '  ', '\t', '\n', '\n\n', '\n \n', ' \n\n\t')
+
+
+def random_text(rng):
+    return ''.join(rng.choice(FRAGMENTS)
+                   for _ in range(rng.randint(0, 60)))
+
+
+def check_round_trip(texts, seed):
+    """First text (and budget) whose chunks do not join back to it, or whose
+    chunk texts carry surrounding whitespace; None if there is none."""
+    rng = random.Random(seed)
+    for _ in range(texts):
+        text = random_text(rng)
+        max_tokens = rng.randint(1, 30)
+        chunks = split_text(text, max_tokens)
+        if (''.join(chunk.text + chunk.separator for chunk in chunks) != text
+                or any(chunk.text != chunk.text.strip() for chunk in chunks)):
+            return text, max_tokens
+    return None
+
+
+def check_endpoints():
+    """Chunked requests that fail, as ``(endpoint, status, body)`` tuples.
+
+    The text starts with whitespace, which the answer must keep.
+    """
+    long_text = "\n\n " + "Une phrase de test assez longue. " * 40
+    # endpoint, body, expected start of the answer
+    bodies = [
+        ('correct', {"text": long_text, "options": None}, "\n\n "),
+        ('correct', {"text": long_text, "options": {"synonyms": True}},
+         "===TEXTE CORRIGÉ===\n\n\n "),
+        ('translate', {"text": long_text, "language": "Anglais"}, "\n\n "),
+    ]
+    failures = []
+    with tempfile.TemporaryDirectory() as directory, \
+            MockLLM(latency=0, tokens_per_second=0, tokens=5) as mock:
+        os.environ.update(
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{directory}/check.db",
+            SECRET_KEY_FILE=os.path.join(directory, 'secret_key'),
+            HISTORY_ARCHIVE_DIR=os.path.join(directory, 'archive'),
+            RESPONSE_CACHE_ENDPOINTS='', CHUNK_MAX_TOKENS='100',
+            SERVER_PREFORK='1')
+        import app
+        client = app.app.test_client()
+        client.post('/api/settings', json={"provider": "ollama", "settings": {
+            "url": mock.url, "model": "mock", "options": {"preload": False}}})
+        for endpoint, body, start in bodies:
+            response = client.post(f'/api/{endpoint}', json=body)
+            data = response.get_json() or {}
+            if (response.status_code != 200
+                    or not data.get('text', '').startswith(start)):
+                failures.append((endpoint, response.status_code, data))
+        if mock.requests <= len(bodies):
+            failures.append(('correct', None, "long texts were not split"))
+        app.history_writer.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--texts', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failures = []
+    failure = check_round_trip(args.texts, args.seed)
+    if failure:
+        failures.append("split_text does not round-trip or strip %r (max_tokens=%d)"
+                        % failure)
+    for endpoint, status, body in check_endpoints():
+        failures.append(f"/api/{endpoint} {body} with {status}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"OK {args.texts} random texts, chunked endpoints")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Import-time budget check for the application.
+
+Imports ``app`` in a fresh interpreter (against a scratch database) with
+``-X importtime`` and fails when:
+
+- a provider SDK was imported, which should only happen on first use;
+- the import took longer than ``--budget-ms``;
+- the resulting RSS is above ``--rss-mb``.
+
+    python -m bench.import_budget --budget-ms 1500 --rss-mb 120
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# Loaded lazily by providers.ClientRegistry
+LAZY_MODULES = ('openai', 'anthropic', 'google.generativeai', 'grpc')
+
+PROBE = """
+import json, resource, sys
+import app
+print(json.dumps({
+    "modules": [m for m in %r if m in sys.modules],
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}))
+""" % (LAZY_MODULES,)
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def measure(root):
+    """One cold import of ``app``: cumulative times per module, SDKs and RSS."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ,
+                   SQLALCHEMY_DATABASE_URI=f"sqlite:///{directory}/budget.db",
+                   SECRET_KEY_FILE=os.path.join(directory, 'secret_key'),
+                   HISTORY_ARCHIVE_DIR=os.path.join(directory, 'archive'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE], cwd=root,
+            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    app_ms = None
+    children = []
+    imported_by_app = []
+    # A module's line comes after its imports', which are indented one level
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        ms, depth, module = (int(match.group(2)) / 1000, len(match.group(3)),
+                             match.group(4))
+        if depth == 3:
+            children.append((ms, module))
+        elif depth == 1:
+            if module == 'app':
+                app_ms, imported_by_app = ms, children
+            children = []
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "app_ms": app_ms,
+        "slowest": sorted(imported_by_app, reverse=True)[:8],
+        "lazy_modules_loaded": probe['modules'],
+        "rss_mb": probe['rss_mb']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--budget-ms', type=float, default=1500)
+    parser.add_argument('--rss-mb', type=float, default=120)
+    parser.add_argument('--runs', type=int, default=3,
+                        help="the fastest run is kept, to reduce noise")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [measure(root) for _ in range(args.runs)]
+    best = min(runs, key=lambda run: run['app_ms'])
+    print(f"import app: {best['app_ms']:.0f} ms (budget {args.budget_ms:.0f} ms), "
+          f"RSS {best['rss_mb']:.0f} MB (budget {args.rss_mb:.0f} MB)")
+    for ms, module in best['slowest']:
+        print(f"  {ms:8.1f} ms  {module}")
+
+    failures = []
+    if best['lazy_modules_loaded']:
+        failures.append("provider SDKs imported at startup: "
+                        + ', '.join(best['lazy_modules_loaded']))
+    if best['app_ms'] > args.budget_ms:
+        failures.append(f"import time over budget: {best['app_ms']:.0f} ms")
+    if best['rss_mb'] > args.rss_mb:
+        failures.append(f"RSS over budget: {best['rss_mb']:.0f} MB")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
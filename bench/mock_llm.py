@@ -0,0 +1,218 @@
+"""Local stand-in for the Ollama and OpenAI-compatible APIs.
+
+Answers ``/api/generate``, ``/api/chat`` and ``/api/tags`` like Ollama and
+``/v1/chat/completions`` and ``/v1/models`` like OpenAI, streamed or not,
+with a configurable time to first token and token rate. No network access is
+needed, so benchmarks measure the application and not a remote provider.
+
+    python -m bench.mock_llm --port 11434 --latency 0.2 --tokens-per-second 50
+"""
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("Bonjour", "merci", "pour", "votre", "message", "nous", "avons",
+         "bien", "reçu", "la", "demande", "et", "reviendrons", "vers", "vous",
+         "rapidement", "avec", "une", "réponse", "détaillée.")
+
+
+def completion(count):
+    """``count`` tokens of plausible French text, starting with a subject."""
+    words = itertools.islice(itertools.cycle(WORDS), max(count - 2, 1))
+    return ["Objet:", " Réponse\n\n"] + [word + " " for word in words]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled or abandoned (hedged) connections are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLM:
+    """Threaded HTTP server emulating a provider; use as a context manager."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2,
+                 tokens_per_second=50.0, tokens=60):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True, name='mock-llm')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tokens_for(self, body):
+        """Completion tokens; honours ``num_predict``/``max_tokens`` like the real APIs."""
+        limit = (body.get('options', {}).get('num_predict')
+                 or body.get('max_tokens'))
+        return completion(min(self.tokens, limit) if limit else self.tokens)
+
+    def pace(self, tokens):
+        """Yield ``tokens`` after the first-token latency, at the token rate."""
+        time.sleep(self.latency)
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for index, token in enumerate(tokens):
+            if index and interval:
+                time.sleep(interval)
+            yield token
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def _json(self, payload, status=200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content_type, chunks):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for chunk in chunks:
+                    data = chunk.encode()
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    self.wfile.flush()
+                self.wfile.write(b'0\r\n\r\n')
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._json({"models": [{"name": "mock"}]})
+                elif self.path.endswith('/models'):
+                    self._json({"object": "list", "data": [{
+                        "id": "mock", "object": "model", "created": 0,
+                        "owned_by": "bench"}]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                body = self._body()
+                with mock._lock:
+                    mock.requests += 1
+                if self.path in ('/api/generate', '/api/chat'):
+                    self._ollama(body, chat=self.path == '/api/chat')
+                elif self.path.endswith('/chat/completions'):
+                    self._openai(body)
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _ollama(self, body, chat):
+                if not chat and 'prompt' not in body:
+                    # Model preload
+                    self._json({"model": body.get('model'), "response": "",
+                                "done": True})
+                    return
+                prompt = json.dumps(body.get('messages') or body.get('prompt'))
+                tokens = mock.tokens_for(body)
+
+                def message(text, done):
+                    data = {"model": body.get('model'), "done": done}
+                    if chat:
+                        data["message"] = {"role": "assistant", "content": text}
+                    else:
+                        data["response"] = text
+                    if done:
+                        data.update(prompt_eval_count=len(prompt) // 4,
+                                    prompt_eval_duration=1000000,
+                                    eval_count=len(tokens))
+                    return data
+
+                if not body.get('stream', True):
+                    self._json(message(''.join(mock.pace(tokens)), True))
+                    return
+                self._stream('application/x-ndjson', itertools.chain(
+                    (json.dumps(message(token, False)) + '\n'
+                     for token in mock.pace(tokens)),
+                    [json.dumps(message('', True)) + '\n']))
+
+            def _openai(self, body):
+                prompt = json.dumps(body.get('messages'))
+                tokens = mock.tokens_for(body)
+                base = {"id": "chatcmpl-bench", "created": int(time.time()),
+                        "model": body.get('model')}
+                usage = {"prompt_tokens": len(prompt) // 4,
+                         "completion_tokens": len(tokens),
+                         "total_tokens": len(prompt) // 4 + len(tokens)}
+                if not body.get('stream'):
+                    self._json(dict(base, object="chat.completion", choices=[{
+                        "index": 0,
+                        "message": {"role": "assistant",
+                                    "content": ''.join(mock.pace(tokens))},
+                        "finish_reason": "stop"}], usage=usage))
+                    return
+
+                def chunk(delta, finish_reason=None):
+                    data = dict(base, object="chat.completion.chunk", choices=[{
+                        "index": 0, "delta": delta,
+                        "finish_reason": finish_reason}])
+                    return f"data: {json.dumps(data)}\n\n"
+
+                self._stream('text/event-stream', itertools.chain(
+                    (chunk({"content": token}) for token in mock.pace(tokens)),
+                    [chunk({}, 'stop'), "data: [DONE]\n\n"]))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help="seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--tokens', type=int, default=60,
+                        help="completion length in tokens")
+    args = parser.parse_args()
+    mock = MockLLM(args.host, args.port, args.latency, args.tokens_per_second,
+                   args.tokens)
+    print(f"Mock LLM listening on {mock.url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""Offline load test of the generation endpoints.
+
+Starts the mock provider (``bench.mock_llm``) and, unless ``--url`` points to
+a running instance, the application on a throwaway SQLite database. It then
+drives ``/api/reformulate``, ``/api/translate``, ``/api/correct`` and
+``/api/generate-email`` at each concurrency level and reports throughput,
+latency percentiles and history-database contention. Results are written as
+JSON so that runs can be compared across versions:
+
+    python -m bench.run --concurrency 1,8,32 --requests 100
+    python -m bench.run --compare bench/results/before.json bench/results/after.json
+"""
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from bench.mock_llm import MockLLM
+
+ENDPOINTS = ('reformulate', 'translate', 'correct', 'generate-email')
+
+SAMPLE_TEXT = ("Bonjour, je vous écris au sujet de la réunion de jeudi. Nous "
+               "avons pris du retard sur le projet et il faudrait revoir le "
+               "planning avec l'équipe avant la fin du mois. ")
+
+
+def payload(endpoint, text):
+    if endpoint == 'reformulate':
+        return {"text": text, "tone": "Professionnel", "format": "Paragraphe",
+                "length": "Moyen"}
+    if endpoint == 'translate':
+        return {"text": text, "language": "English"}
+    if endpoint == 'correct':
+        return {"text": text, "options": {"grammar": True, "spelling": True,
+                                          "punctuation": True}}
+    return {"type": "Demande d'information", "content": text,
+            "sender": "Bench", "tone": "Professionnel"}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of ``values``, or None when empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, math.ceil(len(values) * p / 100) - 1))
+    return values[index]
+
+
+def summarize(values):
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": sum(values) / len(values) if values else None,
+            "max": max(values) if values else None}
+
+
+def start_app(database_dir, mock_url, cache):
+    """Import the application against a scratch database and serve it."""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = (
+        f"sqlite:///{os.path.join(database_dir, 'bench.db')}")
+    # The OpenAI SDK reads its base URL from here when none is given
+    os.environ['OPENAI_BASE_URL'] = f"{mock_url}/v1"
+    os.environ['OLLAMA_URL'] = mock_url
+    os.environ['HISTORY_ARCHIVE_DIR'] = os.path.join(database_dir, 'archive')
+    if not cache:
+        os.environ['RESPONSE_CACHE_ENDPOINTS'] = ''
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name='bench-app').start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def configure(base_url, provider, mock_url):
+    """Point the application's current provider at the mock."""
+    if provider == 'ollama':
+        settings = {"url": mock_url, "model": "mock",
+                    "options": {"preload": False}}
+    else:
+        settings = {"apiKey": "bench", "model": "mock"}
+    response = requests.post(f"{base_url}/api/settings", timeout=30,
+                             json={"provider": provider, "settings": settings})
+    response.raise_for_status()
+
+
+def read_metrics(base_url):
+    """History commit counters from ``/metrics``, summed over labels."""
+    text = requests.get(f"{base_url}/metrics", timeout=30).text
+    totals = {}
+    pattern = re.compile(r'^(reformulator_db_commit_seconds_\w+)(\{[^}]*\})? (\S+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        name, labels = match.group(1), match.group(2) or ''
+        le = re.search(r'le="([^"]+)"', labels)
+        key = (name, float(le.group(1)) if le else None)
+        totals[key] = totals.get(key, 0.0) + float(match.group(3))
+    return totals
+
+
+def writer_stats(base_url):
+    return requests.get(f"{base_url}/api/history/writer/stats",
+                        timeout=30).json()
+
+
+def wait_for_writer(base_url, before, rows, timeout=30):
+    """Wait until ``rows`` more history rows than in ``before`` are committed.
+
+    The queue empties before the batch taken from it is committed, so its
+    size alone does not tell when the writes are done.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = writer_stats(base_url)
+        done = (stats['written'] + stats['failed']
+                - before['written'] - before['failed'])
+        if stats['queued'] == 0 and done >= rows:
+            return
+        time.sleep(0.1)
+
+
+def db_contention(before, after, writer_before, writer_after, max_queued):
+    delta = {key: after.get(key, 0.0) - before.get(key, 0.0) for key in after}
+    commits = delta.get(('reformulator_db_commit_seconds_count', None), 0.0)
+    seconds = delta.get(('reformulator_db_commit_seconds_sum', None), 0.0)
+    # p95 as the upper bound of the bucket holding the 95th percentile
+    p95 = None
+    buckets = sorted((le, count) for (name, le), count in delta.items()
+                     if name == 'reformulator_db_commit_seconds_bucket')
+    for le, count in buckets:
+        if commits and count >= 0.95 * commits:
+            p95 = le
+            break
+    return {
+        "commits": int(commits),
+        "commit_seconds": seconds,
+        "commit_mean": seconds / commits if commits else None,
+        "commit_p95_bound": p95,
+        "rows_written": writer_after['written'] - writer_before['written'],
+        "write_failures": writer_after['failed'] - writer_before['failed'],
+        "max_queued": max_queued
+    }
+
+
+def run_level(base_url, endpoint, concurrency, count, text, stream):
+    """Send ``count`` requests to ``endpoint`` from ``concurrency`` threads."""
+    local = threading.local()
+    url = f"{base_url}/api/{endpoint}" + ('?stream=1' if stream else '')
+    body = payload(endpoint, text)
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.monotonic()
+        first_byte = None
+        try:
+            with session.post(url, json=body, stream=stream,
+                              timeout=600) as response:
+                if stream:
+                    for line in response.iter_lines():
+                        if first_byte is None and line:
+                            first_byte = time.monotonic() - started
+                        if line.startswith(b'event: error'):
+                            return (time.monotonic() - started, first_byte,
+                                    "stream error")
+                else:
+                    response.content
+                    first_byte = time.monotonic() - started
+                error = None if response.status_code == 200 else (
+                    f"HTTP {response.status_code}: {response.text[:200]}")
+        except Exception as e:
+            error = str(e)
+        return time.monotonic() - started, first_byte, error
+
+    writer_before = writer_stats(base_url)
+    metrics_before = read_metrics(base_url)
+    max_queued = 0
+    sampling = threading.Event()
+
+    def sample_queue():
+        nonlocal max_queued
+        while not sampling.wait(0.1):
+            try:
+                max_queued = max(max_queued, writer_stats(base_url)['queued'])
+            except Exception:
+                pass
+
+    sampler = threading.Thread(target=sample_queue, daemon=True)
+    sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one, range(count)))
+    elapsed = time.monotonic() - started
+    sampling.set()
+    sampler.join()
+
+    latencies = [latency for latency, _, error in outcomes if error is None]
+    wait_for_writer(base_url, writer_before, len(latencies))
+    errors = [error for _, _, error in outcomes if error is not None]
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "stream": stream,
+        "requests": count,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "db": db_contention(metrics_before, read_metrics(base_url),
+                            writer_before, writer_stats(base_url), max_queued)
+    }
+    if stream:
+        result["first_byte"] = summarize(
+            [first for _, first, error in outcomes
+             if error is None and first is not None])
+    return result
+
+
+def git_version():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'],
+                                    capture_output=True, text=True).stdout)
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def _ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+
+def print_result(result):
+    latency = result['latency']
+    db = result['db']
+    print(f"{result['endpoint']:>15} c={result['concurrency']:<4} "
+          f"{result['throughput_rps']:8.2f} req/s  p50{_ms(latency['p50'])}ms "
+          f"p95{_ms(latency['p95'])}ms p99{_ms(latency['p99'])}ms  "
+          f"errors={result['errors']}  commits={db['commits']} "
+          f"commit_mean{_ms(db['commit_mean'])}ms max_queued={db['max_queued']}")
+
+
+def compare(baseline_path, current_path, threshold):
+    """Print throughput and p95 changes; True if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    def key(result):
+        return (result['endpoint'], result['concurrency'],
+                result.get('stream', False))
+
+    previous = {key(r): r for r in baseline['results']}
+    regressed = False
+    for result in current['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        throughput = (result['throughput_rps'] / old['throughput_rps'] - 1
+                      if old['throughput_rps'] else 0.0)
+        p95 = (result['latency']['p95'] / old['latency']['p95'] - 1
+               if old['latency']['p95'] and result['latency']['p95'] else 0.0)
+        flag = ''
+        if throughput < -threshold or p95 > threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"{result['endpoint']:>15} c={result['concurrency']:<4} "
+              f"throughput {throughput:+7.1%}  p95 {p95:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help="benchmark a running instance instead")
+    parser.add_argument('--provider', choices=('ollama', 'openai'),
+                        default='ollama')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=50,
+                        help="requests per endpoint and concurrency level")
+    parser.add_argument('--warmup', type=int, default=4)
+    parser.add_argument('--stream', action='store_true',
+                        help="use the SSE variant of the endpoints")
+    parser.add_argument('--text-chars', type=int, default=600)
+    parser.add_argument('--cache', action='store_true',
+                        help="keep the response cache on (off by default)")
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--mock-port', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join('bench', 'results'))
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    text = (SAMPLE_TEXT * (args.text_chars // len(SAMPLE_TEXT) + 1))[:args.text_chars]
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    with MockLLM(port=args.mock_port, latency=args.latency,
+                 tokens_per_second=args.tokens_per_second,
+                 tokens=args.tokens) as mock, \
+            tempfile.TemporaryDirectory() as database_dir:
+        server = None
+        base_url = args.url
+        if base_url is None:
+            server, base_url = start_app(database_dir, mock.url, args.cache)
+        try:
+            configure(base_url, args.provider, mock.url)
+            results = []
+            for endpoint in endpoints:
+                if args.warmup:
+                    run_level(base_url, endpoint, 1, args.warmup, text,
+                              args.stream)
+                for concurrency in levels:
+                    result = run_level(base_url, endpoint, concurrency,
+                                       args.requests, text, args.stream)
+                    print_result(result)
+                    results.append(result)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    report = {
+        "created_at": datetime.utcnow().isoformat() + 'Z',
+        "version": git_version(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ('compare', 'output', 'threshold')},
+        "mock_requests": mock.requests,
+        "results": results
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output, datetime.utcnow().strftime('%Y%m%dT%H%M%SZ') + '.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()
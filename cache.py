@@ -0,0 +1,145 @@
+"""Content-addressed cache for deterministic generations.
+
+Entries are keyed by a hash of (provider, model, system prompt, prompt,
+options). A bounded in-memory LRU sits in front of an optional SQLite file so
+that hits survive restarts and are shared between workers.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+class ResponseCache:
+    """LRU + TTL response cache with an optional SQLite tier.
+
+    Only the endpoints listed in ``endpoints`` are cached. The cache is
+    cleared whenever the prompts stored in ``UserPreferences`` change.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, path=None,
+                 endpoints=()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.endpoints = set(endpoints)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._preferences_version = None
+        self._prompts_fingerprint = None
+        if self.path:
+            with closing(self._connect()) as conn:
+                # Shared by every worker; WAL keeps readers off the write lock
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL)""")
+                conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def enabled_for(self, endpoint):
+        return endpoint in self.endpoints
+
+    @staticmethod
+    def key(provider, model, system, prompt, options=None):
+        payload = json.dumps([provider, model, system, prompt, options or {}],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def sync(self, preferences):
+        """Clear the cache if the prompts changed since the last snapshot."""
+        if preferences.version == self._preferences_version:
+            return
+        prompts = '\0'.join([preferences.system_prompt,
+                             preferences.translation_prompt,
+                             preferences.email_prompt,
+                             preferences.correction_prompt])
+        fingerprint = hashlib.sha256(prompts.encode('utf-8')).hexdigest()
+        with self._lock:
+            changed = (self._prompts_fingerprint is not None
+                       and fingerprint != self._prompts_fingerprint)
+            self._preferences_version = preferences.version
+            self._prompts_fingerprint = fingerprint
+        if changed:
+            self.clear()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value, now + self.ttl)
+        return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self.path:
+            try:
+                with closing(self._connect()) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?)",
+                        (key, value, expires_at))
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing response cache: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM response_cache")
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "endpoints": sorted(self.endpoints),
+                "disk": bool(self.path)
+            }
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key, now):
+        if not self.path:
+            return None
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT value FROM response_cache "
+                    "WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Error reading response cache: {str(e)}")
+            return None
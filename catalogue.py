@@ -0,0 +1,203 @@
+"""Cached catalogue of the models offered by each provider.
+
+Listing models used to hit the remote API on every opening of the settings
+modal. ``ModelCatalogue`` keeps each list for ``ttl`` seconds, then serves the
+stale list while refreshing it in the background (stale-while-revalidate), and
+revalidates with ``If-None-Match`` when the upstream API returns an ETag.
+"""
+import threading
+import time
+
+ANTHROPIC_MODELS = [{
+    "id": "claude-3-opus-20240229",
+    "name": "Claude 3 Opus"
+}, {
+    "id": "claude-3-sonnet-20240229",
+    "name": "Claude 3 Sonnet"
+}, {
+    "id": "claude-3-haiku-20240307",
+    "name": "Claude 3 Haiku"
+}, {
+    "id": "claude-2.1",
+    "name": "Claude 2.1"
+}, {
+    "id": "claude-2.0",
+    "name": "Claude 2.0"
+}, {
+    "id": "claude-instant-1.2",
+    "name": "Claude Instant 1.2"
+}]
+
+# provider -> (credential attribute, message when it is missing)
+CREDENTIALS = {
+    'ollama': ('ollama_url', "Ollama URL not configured"),
+    'openai': ('openai_api_key', "Clé API OpenAI non configurée"),
+    'anthropic': ('anthropic_api_key', "Clé API Anthropic non configurée"),
+    'groq': ('groq_api_key', "Groq API key not configured"),
+    'deepseek': ('deepseek_api_key', "deepseek API key not configured"),
+    'openrouter': ('openrouter_api_key', "openrouter API key not configured"),
+    'gemini': ('google_api_key', "Clé API Google non configurée"),
+}
+
+ERROR_PREFIXES = {
+    'ollama': "Ollama connection error: ",
+    'openai': "Erreur de l'API OpenAI : ",
+    'anthropic': "Erreur de l'API Anthropic : ",
+    'groq': "Failed to fetch Groq models: ",
+    'deepseek': "Failed to fetch deepseek models: ",
+    'openrouter': "Failed to fetch openrouter models: ",
+    'gemini': "Erreur de l'API Gemini : ",
+}
+
+
+class CatalogueError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+class NotModified(Exception):
+    """Raised by a fetcher when the upstream list did not change (HTTP 304)."""
+
+
+class ModelCatalogue:
+    """Per-provider model lists with TTL and background revalidation."""
+
+    def __init__(self, clients, ttl=600, stale_ttl=86400, timeout=10):
+        self.clients = clients
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._refreshing = set()
+
+    def credential(self, provider, preferences):
+        if provider not in CREDENTIALS:
+            raise CatalogueError(f"Unknown provider: {provider}", 404)
+        attribute, missing_message = CREDENTIALS[provider]
+        value = getattr(preferences, attribute)
+        if not value:
+            raise CatalogueError(missing_message, 401)
+        return value
+
+    def get(self, provider, credential, refresh=False):
+        key = (provider, credential)
+        entry = self._entries.get(key)
+        if entry is not None and not refresh:
+            age = time.monotonic() - entry['fetched_at']
+            if age < self.ttl:
+                return entry['models']
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background(key)
+                return entry['models']
+        return self._refresh(key)
+
+    def invalidate(self, provider=None):
+        with self._lock:
+            for key in [k for k in self._entries if provider in (None, k[0])]:
+                del self._entries[key]
+
+    def _refresh_in_background(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._refresh(key)
+            except CatalogueError as e:
+                print(f"Error refreshing {key[0]} models: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _refresh(self, key):
+        provider, credential = key
+        previous = self._entries.get(key)
+        etag = previous['etag'] if previous else None
+        try:
+            models, etag = getattr(self, f"_fetch_{provider}")(credential, etag)
+        except NotModified:
+            models = previous['models']
+        except CatalogueError:
+            raise
+        except Exception as e:
+            raise CatalogueError(f"{ERROR_PREFIXES[provider]}{str(e)}")
+        with self._lock:
+            self._entries[key] = {
+                'models': models,
+                'etag': etag,
+                'fetched_at': time.monotonic()
+            }
+        return models
+
+    def _get_json(self, url, etag, headers=None, error_message=None):
+        headers = dict(headers or {})
+        if etag:
+            headers['If-None-Match'] = etag
+        response = self.clients.session.get(url, headers=headers,
+                                            timeout=self.timeout)
+        if response.status_code == 304:
+            raise NotModified()
+        if response.status_code != 200:
+            raise CatalogueError(error_message or response.text,
+                                 response.status_code)
+        return response.json(), response.headers.get('ETag')
+
+    def _fetch_openai_compatible(self, url, api_key, etag):
+        data, etag = self._get_json(
+            url, etag, {"Authorization": f"Bearer {api_key}"})
+        return [{
+            "id": model["id"],
+            "name": model["id"]
+        } for model in data["data"]], etag
+
+    def _fetch_groq(self, api_key, etag):
+        return self._fetch_openai_compatible(
+            "https://api.groq.com/openai/v1/models", api_key, etag)
+
+    def _fetch_deepseek(self, api_key, etag):
+        return self._fetch_openai_compatible(
+            "https://api.deepseek.com/v1/models", api_key, etag)
+
+    def _fetch_openrouter(self, api_key, etag):
+        data, etag = self._get_json(
+            "https://openrouter.ai/api/v1/models", etag,
+            {"Authorization": f"Bearer {api_key}"})
+        # Only keep the free models (IDs ending with ":free")
+        return [{
+            "id": model["id"],
+            "nom": "free"
+        } for model in data.get("data", [])
+            if model["id"].endswith(":free")], etag
+
+    def _fetch_ollama(self, url, etag):
+        data, etag = self._get_json(f"{url}/api/tags", etag,
+                                    error_message="Failed to fetch Ollama models")
+        return [{
+            "id": model["name"],
+            "name": model["name"]
+        } for model in data["models"]], etag
+
+    def _fetch_openai(self, api_key, etag):
+        client = self.clients.openai('openai', api_key)
+        response = client.with_options(timeout=self.timeout).models.list()
+        return [{
+            "id": model.id,
+            "name": model.id
+        } for model in response.data if 'gpt' in model.id], None
+
+    def _fetch_anthropic(self, api_key, etag):
+        return ANTHROPIC_MODELS, None
+
+    def _fetch_gemini(self, api_key, etag):
+        genai = self.clients.gemini(api_key)
+        models = genai.list_models(request_options={"timeout": self.timeout})
+        return [{
+            "id": model.name,
+            "name": model.display_name
+        } for model in models if 'gemini' in model.name], None
@@ -0,0 +1,91 @@
+"""Splitting long texts into chunks that fit a token budget.
+
+Long documents sent as a single prompt overflow the model context and cannot
+be parallelized. ``split_text`` cuts a text on paragraph boundaries, then on
+sentence boundaries for paragraphs that are too long, then on words for
+sentences that are too long, and packs the pieces into chunks of at most
+``max_tokens`` (estimated) tokens. Each chunk keeps the whitespace that
+followed it so that the processed chunks can be put back together with the
+original layout: ``''.join(c.text + c.separator for c in chunks) == text``.
+Chunk texts never start or end with whitespace: it is kept in the separators,
+and whitespace at the very start of the text becomes a first chunk with an
+empty ``text``, which has nothing to process.
+"""
+import math
+import re
+from dataclasses import dataclass
+
+# Rough average for French and English text with the common tokenizers
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?…;:])\s+')
+WORD_BREAK = re.compile(r'\s+')
+
+
+@dataclass
+class Chunk:
+    text: str
+    separator: str
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _split(text, pattern):
+    """Split ``text`` on ``pattern``, keeping each separator with its piece."""
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        pieces.append(Chunk(text[start:match.start()], match.group()))
+        start = match.end()
+    pieces.append(Chunk(text[start:], ''))
+    # A leading separator is kept as a piece without text
+    return [piece for piece in pieces if piece.text or piece.separator]
+
+
+def _units(text, max_tokens):
+    """Pieces of ``text`` no larger than the budget, on the coarsest boundary."""
+    for paragraph in _split(text, PARAGRAPH_BREAK):
+        if estimate_tokens(paragraph.text) <= max_tokens:
+            yield paragraph
+            continue
+        sentences = _split(paragraph.text, SENTENCE_BREAK)
+        sentences[-1].separator += paragraph.separator
+        for sentence in sentences:
+            if estimate_tokens(sentence.text) <= max_tokens:
+                yield sentence
+                continue
+            words = _split(sentence.text, WORD_BREAK)
+            words[-1].separator += sentence.separator
+            yield from words
+
+
+def split_text(text, max_tokens):
+    """Pack ``text`` into chunks of at most ``max_tokens`` estimated tokens."""
+    chunks = []
+    current = None
+    for unit in _units(text, max_tokens):
+        # Surrounding whitespace goes to the separators: models do not give
+        # it back, so it would be lost from the processed chunks
+        body = unit.text.strip()
+        leading = unit.text[:len(unit.text) - len(unit.text.lstrip())]
+        separator = unit.text[len(leading) + len(body):] + unit.separator
+        if not body:
+            leading, separator = leading + separator, ''
+        if leading:
+            if current is None:
+                current = Chunk('', '')
+                chunks.append(current)
+            current.separator += leading
+        if not body:
+            continue
+        if current is not None and current.text and estimate_tokens(
+                current.text + current.separator + body) <= max_tokens:
+            current.text += current.separator + body
+            current.separator = separator
+            continue
+        current = Chunk(body, separator)
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,69 @@
+"""Database engine configuration.
+
+The database defaults to the local SQLite file but can be any SQLAlchemy URL
+through ``SQLALCHEMY_DATABASE_URI`` (e.g. PostgreSQL for multi-worker
+deployments). SQLite connections are tuned on connect: WAL lets readers run
+alongside the single writer, ``synchronous=NORMAL`` is safe under WAL and
+avoids an fsync per commit, and the busy timeout makes writers wait for the
+lock instead of failing with "database is locked".
+"""
+import os
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URI = 'sqlite:///reformulator.db'
+
+
+def database_uri():
+    return os.getenv('SQLALCHEMY_DATABASE_URI') or DEFAULT_DATABASE_URI
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def engine_options(uri):
+    """Return ``SQLALCHEMY_ENGINE_OPTIONS`` for ``uri``."""
+    if is_sqlite(uri):
+        return {
+            # Seconds the sqlite3 driver waits for a lock
+            'connect_args': {
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')) / 1000,
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': int(os.getenv('DATABASE_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DATABASE_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DATABASE_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True
+    }
+
+
+def sqlite_pragmas():
+    return {
+        # Only takes effect on a new, empty database; existing ones need
+        # retention.enable_incremental_vacuum()
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    }
+
+
+def configure_engine(engine):
+    """Apply the SQLite pragmas to every new connection of ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,641 @@
+"""Single generation engine in front of every AI provider.
+
+Each provider is a ``Backend`` subclass exposing ``generate()`` and
+``stream()``; the endpoints only ever talk to ``GenerationEngine``, which is
+the one place to hook caching, metrics or concurrency control.
+"""
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+import metrics
+import tracing
+from chunking import CHARS_PER_TOKEN, estimate_tokens
+from resilience import ProviderHTTPError, RetryPolicy, is_transient
+from routing import LatencyTracker, failover, hedge_delay, race
+from scheduler import Overloaded
+
+DEFAULT_MAX_TOKENS = 4096
+
+
+class Backend:
+    """Base class for a provider backend.
+
+    ``options`` is a plain dict of generation options (``max_tokens``,
+    ``temperature``...); backends ignore the keys they do not support.
+    Backends whose provider reports token counts store them in ``usage`` as
+    ``(prompt_tokens, completion_tokens)``.
+    """
+
+    name = None
+
+    def __init__(self, clients, preferences, endpoint=None):
+        self.clients = clients
+        self.preferences = preferences
+        self.endpoint = endpoint
+        self.usage = None
+
+    @property
+    def model(self):
+        return getattr(self.preferences, f"{self.name}_model")
+
+    @property
+    def credential(self):
+        return getattr(self.preferences, f"{self.name}_api_key")
+
+    @property
+    def configured(self):
+        return bool(self.credential and self.model)
+
+    def generate(self, system, prompt, options=None):
+        return ''.join(self.stream(system, prompt, options))
+
+    def stream(self, system, prompt, options=None):
+        raise NotImplementedError
+
+
+class PromptEvalStats:
+    """Prompt evaluation counters reported by Ollama.
+
+    Ollama reuses its KV cache when a request starts with the same tokens as
+    the previous one, and then only reports the uncached tokens in
+    ``prompt_eval_count``. The first call seen for a (model, system prompt)
+    pair is treated as cold to calibrate characters per token; later calls
+    estimate the tokens, and time, that the cached prefix saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chars_per_token = {}
+        self.calls = 0
+        self.evaluated_tokens = 0
+        self.eval_ns = 0
+        self.saved_tokens = 0.0
+
+    def record(self, model, system, prompt, prompt_eval_count,
+               prompt_eval_duration):
+        count = prompt_eval_count or 0
+        chars = len(system) + len(prompt)
+        key = (model, hash(system))
+        with self._lock:
+            self.calls += 1
+            self.evaluated_tokens += count
+            self.eval_ns += prompt_eval_duration or 0
+            ratio = self._chars_per_token.get(key)
+            if ratio is None:
+                if count:
+                    self._chars_per_token[key] = chars / count
+                return
+            self.saved_tokens += max(0.0, chars / ratio - count)
+
+    def stats(self):
+        with self._lock:
+            ns_per_token = (self.eval_ns / self.evaluated_tokens
+                            if self.evaluated_tokens else 0)
+            return {
+                "calls": self.calls,
+                "evaluated_tokens": self.evaluated_tokens,
+                "prompt_eval_seconds": self.eval_ns / 1e9,
+                "estimated_saved_tokens": round(self.saved_tokens),
+                "estimated_saved_seconds":
+                    self.saved_tokens * ns_per_token / 1e9
+            }
+
+
+prompt_eval_stats = PromptEvalStats()
+
+
+class OllamaBackend(Backend):
+    """Ollama backend.
+
+    By default (``ollama_options['api'] == 'chat'``) requests go to
+    ``/api/chat`` with the system prompt as a fixed first message, so the
+    prompt evaluation of that prefix is reused between requests. ``'generate'``
+    restores the plain ``/api/generate`` calls.
+    """
+
+    name = 'ollama'
+
+    @property
+    def credential(self):
+        return self.preferences.ollama_url
+
+    @property
+    def settings(self):
+        return self.preferences.ollama_options or {}
+
+    def _runtime_options(self, options):
+        """Merge the stored default and per-operation options with ``options``."""
+        stored = self.settings.get('options', {})
+        merged = dict(stored.get('default', {}))
+        merged.update(stored.get(self.endpoint, {}) if self.endpoint else {})
+        for key, value in (options or {}).items():
+            merged['num_predict' if key == 'max_tokens' else key] = value
+        return merged
+
+    def context_sizes(self):
+        """Effective ``num_ctx`` of the default and of each operation override."""
+        stored = self.settings.get('options', {})
+        default = stored.get('default', {})
+        return {name: values.get('num_ctx', default.get('num_ctx'))
+                for name, values in stored.items() if isinstance(values, dict)}
+
+    @property
+    def use_chat(self):
+        return self.settings.get('api', 'chat') == 'chat'
+
+    @property
+    def url(self):
+        path = '/api/chat' if self.use_chat else '/api/generate'
+        return f"{self.preferences.ollama_url}{path}"
+
+    def _payload(self, system, prompt, options, stream):
+        payload = {'model': self.model, 'stream': stream}
+        if self.use_chat:
+            payload['messages'] = [{
+                "role": "system",
+                "content": system
+            }, {
+                "role": "user",
+                "content": prompt
+            }]
+        else:
+            payload['prompt'] = prompt
+            payload['system'] = system
+        runtime_options = self._runtime_options(options)
+        if runtime_options:
+            payload['options'] = runtime_options
+        if self.settings.get('keep_alive') is not None:
+            payload['keep_alive'] = self.settings['keep_alive']
+        return payload
+
+    def _text(self, chunk):
+        if self.use_chat:
+            return chunk.get('message', {}).get('content', '')
+        return chunk.get('response', '')
+
+    def _record(self, system, prompt, data):
+        prompt_eval_stats.record(self.model, system, prompt,
+                                 data.get('prompt_eval_count'),
+                                 data.get('prompt_eval_duration'))
+        if 'eval_count' in data:
+            self.usage = (data.get('prompt_eval_count') or 0,
+                          data['eval_count'])
+
+    def preload(self):
+        """Load the model into memory; a request without prompt only loads it.
+
+        The default runtime options are sent too: Ollama reloads the model
+        when a request asks for another ``num_ctx`` than the loaded one.
+        """
+        payload = {'model': self.model}
+        if self.settings.get('keep_alive') is not None:
+            payload['keep_alive'] = self.settings['keep_alive']
+        options = self._runtime_options(None)
+        if options:
+            payload['options'] = options
+        contexts = self.context_sizes()
+        if len(set(contexts.values())) > 1:
+            print(f"Ollama num_ctx differs between operations ({contexts}): "
+                  "the model is reloaded each time it changes")
+        response = self.clients.session.post(
+            f"{self.preferences.ollama_url}/api/generate", json=payload,
+            timeout=self.clients.timeout(self.name))
+        return response.status_code == 200
+
+    def generate(self, system, prompt, options=None):
+        response = self.clients.session.post(
+            self.url, json=self._payload(system, prompt, options, False),
+            timeout=self.clients.timeout(self.name))
+        if response.status_code != 200:
+            raise ProviderHTTPError(self.name, response.status_code,
+                                    response.text)
+        data = response.json()
+        self._record(system, prompt, data)
+        return self._text(data)
+
+    def stream(self, system, prompt, options=None):
+        with self.clients.session.post(
+                self.url,
+                json=self._payload(system, prompt, options, True),
+                stream=True,
+                timeout=self.clients.timeout(self.name)) as response:
+            if response.status_code != 200:
+                raise ProviderHTTPError(self.name, response.status_code,
+                                        response.text)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if text := self._text(chunk):
+                    yield text
+                if chunk.get('done'):
+                    self._record(system, prompt, chunk)
+                    break
+
+
+class OpenAICompatibleBackend(Backend):
+    """OpenAI and the providers speaking its API (Groq, DeepSeek, OpenRouter)."""
+
+    def __init__(self, clients, preferences, endpoint=None, name='openai'):
+        super().__init__(clients, preferences, endpoint)
+        self.name = name
+
+    @property
+    def client(self):
+        return self.clients.openai(
+            self.name, getattr(self.preferences, f"{self.name}_api_key"))
+
+    def _kwargs(self, system, prompt, options):
+        kwargs = dict(options or {})
+        kwargs['model'] = self.model
+        kwargs['messages'] = [{
+            "role": "system",
+            "content": system
+        }, {
+            "role": "user",
+            "content": prompt
+        }]
+        return kwargs
+
+    def generate(self, system, prompt, options=None):
+        response = self.client.chat.completions.create(
+            **self._kwargs(system, prompt, options))
+        if response.usage:
+            self.usage = (response.usage.prompt_tokens,
+                          response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    def stream(self, system, prompt, options=None):
+        response = self.client.chat.completions.create(
+            stream=True, **self._kwargs(system, prompt, options))
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class AnthropicBackend(Backend):
+    name = 'anthropic'
+
+    def _kwargs(self, system, prompt, options):
+        kwargs = dict(options or {})
+        kwargs.setdefault('max_tokens', DEFAULT_MAX_TOKENS)
+        kwargs['model'] = self.model
+        kwargs['system'] = system
+        kwargs['messages'] = [{
+            "role": "user",
+            "content": prompt
+        }]
+        return kwargs
+
+    def generate(self, system, prompt, options=None):
+        client = self.clients.anthropic(self.preferences.anthropic_api_key)
+        message = client.messages.create(**self._kwargs(system, prompt, options))
+        self.usage = (message.usage.input_tokens, message.usage.output_tokens)
+        return message.content[0].text
+
+    def stream(self, system, prompt, options=None):
+        client = self.clients.anthropic(self.preferences.anthropic_api_key)
+        with client.messages.stream(
+                **self._kwargs(system, prompt, options)) as stream:
+            for text in stream.text_stream:
+                yield text
+            usage = stream.get_final_message().usage
+            self.usage = (usage.input_tokens, usage.output_tokens)
+
+
+class GeminiBackend(Backend):
+    name = 'gemini'
+
+    @property
+    def credential(self):
+        return self.preferences.google_api_key
+
+    def _generate_content(self, system, prompt, options, stream):
+        genai = self.clients.gemini(self.preferences.google_api_key)
+        model = genai.GenerativeModel(self.model)
+        config = dict(options or {})
+        if 'max_tokens' in config:
+            config['max_output_tokens'] = config.pop('max_tokens')
+        return model.generate_content([{
+            "role": "user",
+            "parts": [system]
+        }, {
+            "role": "user",
+            "parts": [prompt]
+        }], generation_config=config or None, stream=stream,
+            request_options={"timeout": self.clients.timeout(self.name)[1]})
+
+    def _record(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        if usage and usage.prompt_token_count:
+            self.usage = (usage.prompt_token_count,
+                          usage.candidates_token_count)
+
+    def generate(self, system, prompt, options=None):
+        response = self._generate_content(system, prompt, options, False)
+        self._record(response)
+        return response.text
+
+    def stream(self, system, prompt, options=None):
+        for chunk in self._generate_content(system, prompt, options, True):
+            # The last chunk carries the totals for the whole response
+            self._record(chunk)
+            if chunk.text:
+                yield chunk.text
+
+
+BACKENDS = {
+    'ollama': OllamaBackend,
+    'openai': partial(OpenAICompatibleBackend, name='openai'),
+    'groq': partial(OpenAICompatibleBackend, name='groq'),
+    'deepseek': partial(OpenAICompatibleBackend, name='deepseek'),
+    'openrouter': partial(OpenAICompatibleBackend, name='openrouter'),
+    'anthropic': AnthropicBackend,
+    'gemini': GeminiBackend,
+}
+
+
+class GenerationEngine:
+    """Routes generation calls to the backend of the configured provider.
+
+    ``endpoint`` names the calling operation (``'translate'``...) and decides
+    whether the optional response ``cache`` is consulted.
+    """
+
+    def __init__(self, clients, cache=None, max_batch_workers=4,
+                 scheduler=None, retry=None, breaker=None):
+        self.clients = clients
+        self.cache = cache
+        self.max_batch_workers = max_batch_workers
+        self.scheduler = scheduler
+        self.retry = retry or RetryPolicy(retries=0)
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+    def backend(self, preferences, provider=None, endpoint=None):
+        provider = provider or preferences.current_provider
+        if provider not in BACKENDS:
+            raise ValueError(f"Unknown provider: {provider}")
+        return BACKENDS[provider](self.clients, preferences, endpoint)
+
+    def backends(self, preferences, provider=None, endpoint=None):
+        """The backend of ``provider`` alone, or of the current provider
+        followed by the configured fallbacks of ``endpoint``."""
+        if provider:
+            return [self.backend(preferences, provider, endpoint)]
+        fallbacks = preferences.routing.get('fallbacks', {})
+        chain = [preferences.current_provider,
+                 *fallbacks.get(endpoint, fallbacks.get('default', []))]
+        backends = []
+        for name in dict.fromkeys(chain):
+            if name not in BACKENDS:
+                continue
+            backend = BACKENDS[name](self.clients, preferences, endpoint)
+            # Fallbacks without credentials or model are skipped
+            if not backends or backend.configured:
+                backends.append(backend)
+        if not backends:
+            raise ValueError(f"Unknown provider: {preferences.current_provider}")
+        return backends
+
+    def _route(self, preferences, backends, make_stream, kind, on_winner=None):
+        """Fail over along ``backends``, hedging when enabled.
+
+        ``on_winner`` is called with the backend whose answer is streamed.
+        """
+        streams = [partial(make_stream, backend) for backend in backends]
+        delay = None
+        if len(backends) > 1:
+            delay = hedge_delay(preferences.routing.get('hedge', {}),
+                                self.latency, f"{backends[0].name}:{kind}")
+        report = None
+        if on_winner is not None:
+            report = lambda index: on_winner(backends[index])
+        if delay is None:
+            return failover(streams, report)
+        return race(streams, delay, report)
+
+    def _slot(self, backend):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(backend.name, backend.model)
+
+    def _check_circuit(self, backend):
+        if self.breaker is not None:
+            self.breaker.check(backend.name)
+
+    def _record(self, backend, error=None):
+        """Report the outcome of a call to the metrics and circuit breaker."""
+        labels = self._labels(backend)
+        if error is None:
+            metrics.provider_calls.inc(outcome='ok', **labels)
+        elif isinstance(error, Overloaded):
+            metrics.provider_calls.inc(outcome='rejected', **labels)
+        else:
+            metrics.provider_calls.inc(outcome='error', **labels)
+            metrics.provider_errors.inc(error=type(error).__name__, **labels)
+        if self.breaker is None:
+            return
+        if error is None:
+            self.breaker.record_success(backend.name)
+        elif isinstance(error, Overloaded):
+            # Rejected locally: the provider was not called
+            self.breaker.release(backend.name)
+        elif is_transient(error):
+            self.breaker.record_failure(backend.name)
+        else:
+            # The provider answered, e.g. a 400 for a bad request
+            self.breaker.record_success(backend.name)
+
+    def _abandon(self, backend, started):
+        """Report a stream closed by its consumer (client gone, lost race)."""
+        metrics.provider_calls.inc(outcome='abandoned',
+                                   **self._labels(backend))
+        if self.breaker is None:
+            return
+        if started:
+            # The provider was answering: a half-open trial succeeded
+            self.breaker.record_success(backend.name)
+        else:
+            self.breaker.release(backend.name)
+
+    @staticmethod
+    def _labels(backend):
+        return {'endpoint': backend.endpoint or '', 'provider': backend.name,
+                'model': backend.model or ''}
+
+    def _observe(self, backend, started, system, prompt, completion_chars):
+        """Record the duration and token counts of a successful call."""
+        labels = self._labels(backend)
+        metrics.call_duration.observe(time.monotonic() - started, **labels)
+        prompt_tokens, completion_tokens = backend.usage or (
+            estimate_tokens(system) + estimate_tokens(prompt),
+            math.ceil(completion_chars / CHARS_PER_TOKEN))
+        metrics.tokens.inc(prompt_tokens, kind='prompt', **labels)
+        metrics.tokens.inc(completion_tokens, kind='completion', **labels)
+
+    def _call(self, backend, system, prompt, options):
+        """``backend.generate()`` behind the breaker, a slot and retries."""
+        attempt = 0
+        while True:
+            self._check_circuit(backend)
+            requested = time.monotonic()
+            try:
+                with self._slot(backend):
+                    started = time.monotonic()
+                    metrics.queue_wait.observe(started - requested,
+                                               **self._labels(backend))
+                    tracing.record('queue', started - requested,
+                                   provider=backend.name)
+                    backend.usage = None
+                    with tracing.span('provider', provider=backend.name,
+                                      model=backend.model, attempt=attempt):
+                        response_text = backend.generate(system, prompt,
+                                                         options)
+                    self.latency.record(f"{backend.name}:generate",
+                                        time.monotonic() - started)
+                    self._observe(backend, started, system, prompt,
+                                  len(response_text or ''))
+            except Exception as e:
+                self._record(backend, e)
+                if not self.retry.should_retry(e, attempt):
+                    raise
+                print(f"Retrying {backend.name} after error: {str(e)}")
+                time.sleep(self.retry.delay(e, attempt))
+                attempt += 1
+                continue
+            self._record(backend)
+            if not response_text:
+                raise Exception(f"No response from {backend.name}")
+            return response_text
+
+    def _call_once(self, backend, system, prompt, options):
+        # ``_call()`` as a one-item stream, for failover() and race()
+        yield self._call(backend, system, prompt, options)
+
+    def _call_stream(self, backend, system, prompt, options):
+        """Like ``_call()``; a stream is only retried before its first token."""
+        attempt = 0
+        while True:
+            self._check_circuit(backend)
+            started = False
+            queued = time.monotonic()
+            try:
+                with self._slot(backend):
+                    requested = time.monotonic()
+                    labels = self._labels(backend)
+                    metrics.queue_wait.observe(requested - queued, **labels)
+                    tracing.record('queue', requested - queued,
+                                   provider=backend.name)
+                    backend.usage = None
+                    completion_chars = 0
+                    for token in backend.stream(system, prompt, options):
+                        if not started:
+                            first_token = time.monotonic() - requested
+                            self.latency.record(f"{backend.name}:stream",
+                                                first_token)
+                            metrics.time_to_first_token.observe(first_token,
+                                                                **labels)
+                            tracing.record('first_token', first_token,
+                                           provider=backend.name)
+                        started = True
+                        completion_chars += len(token)
+                        yield token
+                    self._observe(backend, requested, system, prompt,
+                                  completion_chars)
+                    tracing.record('provider', time.monotonic() - requested,
+                                   provider=backend.name, model=backend.model,
+                                   attempt=attempt)
+            except GeneratorExit:
+                self._abandon(backend, started)
+                raise
+            except Exception as e:
+                self._record(backend, e)
+                if started or not self.retry.should_retry(e, attempt):
+                    raise
+                print(f"Retrying {backend.name} after error: {str(e)}")
+                time.sleep(self.retry.delay(e, attempt))
+                attempt += 1
+                continue
+            self._record(backend)
+            if not started:
+                raise Exception(f"No response from {backend.name}")
+            return
+
+    def _cache_key(self, preferences, backend, endpoint, system, prompt,
+                   options):
+        if self.cache is None or not self.cache.enabled_for(endpoint):
+            return None
+        self.cache.sync(preferences)
+        return self.cache.key(backend.name, backend.model, system, prompt,
+                              options)
+
+    def generate(self, preferences, system, prompt, options=None,
+                 provider=None, endpoint=None):
+        backends = self.backends(preferences, provider, endpoint)
+        cache_key = self._cache_key(preferences, backends[0], endpoint, system,
+                                    prompt, options)
+        if cache_key:
+            with tracing.span('cache'):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        answered = []
+        response_text = ''.join(self._route(
+            preferences, backends,
+            lambda backend: self._call_once(backend, system, prompt, options),
+            'generate', answered.append))
+        if cache_key:
+            # Under the key of the backend that answered, not the primary's
+            self.cache.set(self.cache.key(answered[0].name, answered[0].model,
+                                          system, prompt, options),
+                           response_text)
+        return response_text
+
+    def stream(self, preferences, system, prompt, options=None,
+               provider=None, endpoint=None):
+        backends = self.backends(preferences, provider, endpoint)
+        cache_key = self._cache_key(preferences, backends[0], endpoint, system,
+                                    prompt, options)
+        if cache_key:
+            with tracing.span('cache'):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        answered = []
+        for token in self._route(
+                preferences, backends,
+                lambda backend: self._call_stream(backend, system, prompt,
+                                                  options),
+                'stream', answered.append):
+            chunks.append(token)
+            yield token
+        if cache_key:
+            self.cache.set(self.cache.key(answered[0].name, answered[0].model,
+                                          system, prompt, options),
+                           ''.join(chunks))
+
+    def batch(self, preferences, items, provider=None, endpoint=None,
+              max_workers=None):
+        """Generate ``(system, prompt[, options])`` items concurrently.
+
+        Yields, in input order, the generated text or the exception raised
+        for that item, so that one failure does not abort the whole batch.
+        """
+        def run(item):
+            try:
+                return self.generate(preferences, *item, provider=provider,
+                                     endpoint=endpoint)
+            except Exception as e:
+                return e
+
+        workers = max_workers or self.max_batch_workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(tracing.bind(run), items)
@@ -0,0 +1,51 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py``.
+
+The application is imported once by the master (``preload_app``), so the
+schema upgrade runs once and workers fork with the code already loaded. Each
+worker serves requests on a pool of threads, or on greenlets with
+``ASYNC_MODE=gevent``. On SIGTERM, workers stop accepting connections and
+finish their in-flight requests, provider streams included, for up to
+``graceful_timeout`` seconds, then flush the pending history rows.
+
+Limits such as ``PROVIDER_CONCURRENCY`` apply per worker.
+"""
+import os
+
+import async_mode
+
+wsgi_app = 'app:app'
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+if async_mode.is_enabled():
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+    # The gevent worker monkey-patches itself after the fork, and the app
+    # must be imported after that
+    preload_app = False
+else:
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+    preload_app = True
+    # Tells app.py to leave its background threads to post_fork()
+    os.environ['SERVER_PREFORK'] = '1'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import after_fork
+        after_fork()
+
+
+def post_worker_init(worker):
+    if async_mode.is_enabled():
+        async_mode.init_grpc()
+
+
+def worker_exit(server, worker):
+    from app import history_writer
+    history_writer.close()
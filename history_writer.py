@@ -0,0 +1,151 @@
+"""Write-behind persistence of history rows.
+
+Generation endpoints used to add and commit their history row before
+answering, putting a commit (and its fsync) on the user-visible path and
+turning a failed commit into a 500. ``HistoryWriter`` queues the rows instead
+and a background thread commits them in batches. The queue is bounded: when
+it is full, producers wait up to ``put_timeout`` seconds and then write the
+row themselves, so history is never dropped. Pending rows are flushed at
+shutdown.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from models import db
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Batches history rows from every endpoint into grouped commits."""
+
+    def __init__(self, app, max_queue=1000, batch_size=50, flush_interval=0.5,
+                 put_timeout=1.0, enabled=True):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.enabled = enabled
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        if enabled:
+            atexit.register(self.close)
+
+    def submit(self, *entries):
+        """Queue history rows for writing; blocks briefly when the queue is full."""
+        for entry in entries:
+            # Keep the request time, not the time of the deferred insert
+            if entry.created_at is None:
+                entry.created_at = datetime.utcnow()
+        if not self.enabled:
+            self._write(list(entries))
+            return
+        self._ensure_worker()
+        for index, entry in enumerate(entries):
+            try:
+                self._queue.put(entry, timeout=self.put_timeout)
+            except queue.Full:
+                print("History queue full, writing synchronously")
+                self._write(list(entries[index:]))
+                return
+
+    def flush(self, timeout=None):
+        """Wait until every queued row has been committed."""
+        if not self.enabled or self._thread is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                self._queue.all_tasks_done.wait(remaining)
+
+    def close(self, timeout=10):
+        """Flush the queue and stop the worker."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "failed": self.failed
+        }
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='history-writer')
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                self._queue.task_done()
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            try:
+                self._write(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, entries):
+        with self.app.app_context():
+            try:
+                db.session.add_all(entries)
+                started = time.monotonic()
+                db.session.commit()
+                metrics.db_commit.observe(time.monotonic() - started,
+                                          mode='batch')
+                self.written += len(entries)
+                return
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error writing history batch: {str(e)}")
+            # Retry one by one so that a single bad row does not drop the batch
+            for entry in entries:
+                try:
+                    db.session.add(entry)
+                    started = time.monotonic()
+                    db.session.commit()
+                    metrics.db_commit.observe(time.monotonic() - started,
+                                              mode='row')
+                    self.written += 1
+                except Exception as e:
+                    db.session.rollback()
+                    self.failed += 1
+                    print(f"Error writing history entry: {str(e)}")
@@ -1,4 +1,16 @@
+import os
+
+import async_mode
+
+async_mode.enable()
+
 from app import app
 
+# Development server; in production use gunicorn -c gunicorn.conf.py
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    port = int(os.getenv('PORT', '5000'))
+    if async_mode.is_enabled():
+        async_mode.serve(app, "0.0.0.0", port)
+    else:
+        app.run(host="0.0.0.0", port=port,
+                debug=os.getenv('FLASK_DEBUG') == '1', threaded=True)
@@ -0,0 +1,188 @@
+"""Minimal Prometheus metrics (text exposition format 0.0.4).
+
+Counters and histograms are kept in memory, per process, and rendered by
+``Registry.render()`` for the ``/metrics`` endpoint. Gauges are read from
+callbacks at scrape time so that they always reflect the live state of the
+scheduler, circuit breaker and queues.
+"""
+import math
+import threading
+
+# Seconds; LLM calls range from tens of milliseconds (cache, small models)
+# to minutes (long texts on CPU)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), value)
+                    for key, value in self._values.items()]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket",
+                                    _labels(self.labelnames, key,
+                                            [('le', _number(bound))]),
+                                    cumulative))
+                samples.append((f"{self.name}_sum",
+                                _labels(self.labelnames, key), total))
+                samples.append((f"{self.name}_count",
+                                _labels(self.labelnames, key), count))
+        return samples
+
+
+class Collected:
+    """Metric whose samples come from ``callback()`` at scrape time.
+
+    The callback returns ``[(label values tuple, value), ...]``; ``type`` is
+    ``'gauge'``, or ``'counter'`` for totals kept by another component.
+    """
+
+    def __init__(self, name, documentation, labelnames, callback,
+                 type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error collecting {self.name}: {str(e)}")
+            return []
+        return [(self.name, _labels(self.labelnames, key), value)
+                for key, value in values]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames,
+                                       buckets))
+
+    def collect(self, name, documentation, labelnames, callback,
+                type='gauge'):
+        return self.register(Collected(name, documentation, labelnames,
+                                       callback, type))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+PROVIDER_LABELS = ('endpoint', 'provider', 'model')
+
+http_requests = registry.counter(
+    'reformulator_http_requests_total', 'HTTP requests by endpoint and status.',
+    ('endpoint', 'method', 'status'))
+http_duration = registry.histogram(
+    'reformulator_http_request_duration_seconds',
+    'HTTP request duration until the response is sent.', ('endpoint', 'method'))
+provider_calls = registry.counter(
+    'reformulator_provider_calls_total',
+    'Provider calls by outcome (ok, error, rejected, abandoned).',
+    PROVIDER_LABELS + ('outcome',))
+provider_errors = registry.counter(
+    'reformulator_provider_errors_total', 'Provider call errors by type.',
+    PROVIDER_LABELS + ('error',))
+queue_wait = registry.histogram(
+    'reformulator_provider_queue_wait_seconds',
+    'Time spent waiting for a provider slot.', PROVIDER_LABELS)
+time_to_first_token = registry.histogram(
+    'reformulator_provider_time_to_first_token_seconds',
+    'Time from the provider call to its first token.', PROVIDER_LABELS)
+call_duration = registry.histogram(
+    'reformulator_provider_call_duration_seconds',
+    'Total duration of a provider call.', PROVIDER_LABELS)
+tokens = registry.counter(
+    'reformulator_tokens_total',
+    'Prompt and completion tokens (reported by the provider, else estimated).',
+    PROVIDER_LABELS + ('kind',))
+db_commit = registry.histogram(
+    'reformulator_db_commit_seconds',
+    'Duration of history commits (batch, or row when retrying a batch).',
+    ('mode',))
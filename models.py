@@ -1,10 +1,47 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from datetime import datetime
 import os
 
 db = SQLAlchemy()
 
 
+def default_ollama_options():
+    return {
+        'api': 'chat',  # 'chat' reuses the evaluated system prompt prefix
+        'keep_alive': '30m',  # how long Ollama keeps the model loaded
+        'preload': True,  # load the model at startup and on model change
+        # Ollama runtime options (num_ctx, num_predict, num_thread...),
+        # 'default' applies to every operation and is overridden per operation
+        'options': {
+            'default': {},
+            'reformulate': {},
+            'correct': {},
+            'translate': {},
+            'generate-email': {}
+        }
+    }
+
+
+def default_routing():
+    return {
+        # Providers tried, in order, after the current one fails; per
+        # operation ('translate'...) or 'default'
+        'fallbacks': {
+            'default': []
+        },
+        # Also start the first fallback when the current provider has not
+        # produced a token after its p95 time to first token
+        'hedge': {
+            'enabled': False,
+            'percentile': 95,
+            'min_delay': 1.0,  # seconds, bounds of the hedging delay
+            'max_delay': 10.0,
+            'min_samples': 20  # max_delay is used until then
+        }
+    }
+
+
 class UserPreferences(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
@@ -50,6 +87,10 @@ class UserPreferences(db.Model):
     ollama_model = db.Column(db.String(100),
                           nullable=False,
                           default="qwen2.5:3b")
+    ollama_options = db.Column(db.JSON, default=default_ollama_options)
+
+    # Failover and hedging between providers
+    routing = db.Column(db.JSON, default=default_routing)
 
     # OpenAI Settings
     openai_api_key = db.Column(db.String(255))
@@ -92,7 +133,7 @@ class UserPreferences(db.Model):
 
     @staticmethod
     def get_or_create():
-        pref = UserPreferences.query.first()
+        pref = UserPreferences.query.order_by(UserPreferences.id).first()
         if not pref:
             pref = UserPreferences(
                 ollama_url=os.getenv('OLLAMA_URL', 'http://localhost:11434'),
@@ -257,7 +298,8 @@ class ReformulationHistory(db.Model):
     length = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime,
                         nullable=False,
-                        default=datetime.utcnow)
+                        default=datetime.utcnow,
+                        index=True)
 
     def to_dict(self):
         return {
@@ -281,7 +323,8 @@ class EmailHistory(db.Model):
     generated_email = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime,
                         nullable=False,
-                        default=datetime.utcnow)
+                        default=datetime.utcnow,
+                        index=True)
 
     def to_dict(self):
         return {
@@ -301,7 +344,7 @@ class TranslationHistory(db.Model):
     translated_text = db.Column(db.Text, nullable=False)
     source_language = db.Column(db.String(50))
     target_language = db.Column(db.String(50), nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -319,7 +362,7 @@ class CorrectionHistory(db.Model):
     original_text = db.Column(db.Text, nullable=False)
     corrected_text = db.Column(db.Text, nullable=False)
     corrections = db.Column(db.JSON, nullable=False)  # Store details about corrections made
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -329,3 +372,26 @@ class CorrectionHistory(db.Model):
             'corrections': self.corrections,
             'created_at': self.created_at.isoformat()
         }
+
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a database was first created.
+
+    ``db.create_all()`` never alters existing tables, so new nullable columns
+    are added here with ``ALTER TABLE ... ADD COLUMN`` and missing indexes are
+    created.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
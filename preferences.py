@@ -0,0 +1,141 @@
+"""In-memory, versioned snapshot of the user preferences.
+
+Every request used to re-parse ``.env``, run ``UserPreferences.get_or_create()``
+and commit. ``PreferencesStore`` keeps an immutable snapshot instead and only
+rebuilds it when ``.env`` (mtime) or the ``UserPreferences`` row
+(``updated_at``) actually changes.
+"""
+import copy
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from dotenv import find_dotenv, load_dotenv
+
+from models import db, UserPreferences, default_ollama_options, default_routing
+
+
+@dataclass(frozen=True)
+class PreferencesSnapshot:
+    version: int
+    updated_at: datetime
+    current_provider: str
+    ollama_url: str
+    ollama_model: str
+    ollama_options: dict
+    routing: dict
+    openai_api_key: Optional[str]
+    openai_model: Optional[str]
+    anthropic_api_key: Optional[str]
+    anthropic_model: Optional[str]
+    groq_api_key: Optional[str]
+    groq_model: Optional[str]
+    deepseek_api_key: Optional[str]
+    deepseek_model: Optional[str]
+    openrouter_api_key: Optional[str]
+    openrouter_model: Optional[str]
+    google_api_key: Optional[str]
+    gemini_model: Optional[str]
+    system_prompt: str
+    translation_prompt: str
+    email_prompt: str
+    correction_prompt: str
+    syntax_rules: dict
+    reformulation_preferences: dict
+
+    @classmethod
+    def from_model(cls, pref, version):
+        return cls(
+            version=version,
+            updated_at=pref.updated_at,
+            current_provider=pref.current_provider,
+            ollama_url=pref.ollama_url,
+            ollama_model=pref.ollama_model,
+            ollama_options=copy.deepcopy(
+                pref.ollama_options or default_ollama_options()),
+            routing=copy.deepcopy(pref.routing or default_routing()),
+            openai_api_key=pref.openai_api_key,
+            openai_model=pref.openai_model,
+            anthropic_api_key=pref.anthropic_api_key,
+            anthropic_model=pref.anthropic_model,
+            groq_api_key=pref.groq_api_key,
+            groq_model=pref.groq_model,
+            deepseek_api_key=pref.deepseek_api_key,
+            deepseek_model=pref.deepseek_model,
+            openrouter_api_key=pref.openrouter_api_key,
+            openrouter_model=pref.openrouter_model,
+            google_api_key=pref.google_api_key,
+            gemini_model=pref.gemini_model,
+            system_prompt=pref.system_prompt,
+            translation_prompt=pref.translation_prompt,
+            email_prompt=pref.email_prompt,
+            correction_prompt=pref.correction_prompt,
+            # Deep copies so that the snapshot never aliases ORM state
+            syntax_rules=copy.deepcopy(pref.syntax_rules or {}),
+            reformulation_preferences=copy.deepcopy(
+                pref.reformulation_preferences or {}))
+
+
+class PreferencesStore:
+    """Holds the current ``PreferencesSnapshot`` and rebuilds it on change.
+
+    Staleness is only checked every ``check_interval`` seconds so that the
+    hot path is a plain attribute read. ``invalidate()`` forces a rebuild on
+    the next access, which is what writers in this process should call.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+        self._env_mtime = None
+        self._next_check = 0.0
+
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._is_stale():
+                self._rebuild()
+            self._next_check = time.monotonic() + self.check_interval
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    @staticmethod
+    def _env_path():
+        return find_dotenv(usecwd=True) or find_dotenv()
+
+    def _read_env_mtime(self):
+        path = self._env_path()
+        if not path:
+            return None
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _is_stale(self):
+        if self._read_env_mtime() != self._env_mtime:
+            return True
+        # Same row as get_or_create(), even if a race ever inserted two
+        updated_at = db.session.query(UserPreferences.updated_at).order_by(
+            UserPreferences.id).limit(1).scalar()
+        return updated_at != self._snapshot.updated_at
+
+    def _rebuild(self):
+        path = self._env_path()
+        if path:
+            load_dotenv(path, override=True)
+        self._env_mtime = self._read_env_mtime()
+        # get_or_create() applies the environment overrides and commits
+        pref = UserPreferences.get_or_create()
+        self._version += 1
+        self._snapshot = PreferencesSnapshot.from_model(pref, self._version)
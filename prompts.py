@@ -0,0 +1,208 @@
+"""Prompt builders for the generation endpoints.
+
+Each builder returns the ``(system, prompt)`` pair sent to the provider.
+
+The static parts of the prompts are rendered once per option combination
+(tone, format, length, emojis, correction options...) and cached; a request
+only splices the user text into them. Besides saving work on every request,
+this keeps the prompts byte-for-byte stable, which provider-side prefix
+caching relies on. Parts derived from the stored prompts are cached per
+preferences version by ``PromptTemplates``.
+"""
+import threading
+from functools import lru_cache
+
+EMAIL_FORMAT_INSTRUCTIONS = """
+Structure OBLIGATOIRE pour le format mail:
+1. Ligne "Objet: [sujet]" (OBLIGATOIRE en début d'email)
+2. Formule de salutation appropriée et personnalisée
+3. Corps du message structuré en paragraphes clairs
+4. Formule de politesse adaptée au contexte
+5. Signature professionnelle
+
+Règles supplémentaires format mail:
+- L'objet doit être concis et pertinent
+- La salutation doit être adaptée au destinataire
+- Les paragraphes doivent être courts et bien espacés
+- La formule de politesse doit correspondre au ton choisi
+- La signature doit inclure les informations essentielles
+"""
+
+REFORMULATION_HEAD = """INSTRUCTIONS DE REFORMULATION :
+Ce message est une réponse à un email reçu.
+
+===EMAIL REÇU (NE PAS REFORMULER)=== 
+"""
+
+REFORMULATION_TEXT = """
+
+===RÉPONSE À REFORMULER=== 
+"""
+
+CORRECTION_OPTIONS = ('grammar', 'spelling', 'style', 'punctuation', 'syntax',
+                      'synonyms')
+SYNTAX_RULES = ('word_order', 'subject_verb_agreement', 'verb_tense',
+                'gender_number', 'relative_pronouns')
+
+
+@lru_cache(maxsize=256)
+def _reformulation_tail(tone, format, length, use_emojis):
+    email_format_instructions = (EMAIL_FORMAT_INSTRUCTIONS
+                                 if format.lower() == 'mail' else '')
+    return f"""
+
+RÈGLES STRICTES :
+1. REFORMULER UNIQUEMENT le texte sous "===RÉPONSE À REFORMULER==="
+2. NE PAS reformuler ni inclure l'email reçu
+3. Produire une réponse cohérente avec l'email reçu
+4. {" AJOUTER des emojis pertinents et appropriés au contexte" if use_emojis else "NE PAS ajouter d'emojis"}
+
+Paramètres de reformulation :
+- Ton désiré : {tone} (IMPORTANT: Adapter strictement le ton selon cette valeur)
+- Format souhaité : {format}
+- Longueur cible : {length}
+- Emojis : {"Oui, ajouter des emojis pertinents" if use_emojis else "Non"}
+
+Instructions spécifiques pour le ton {tone}:
+- Si Professionnel : langage soutenu, formel et courtois {", emojis professionnels uniquement" if use_emojis else ""}
+- Si Informatif : style clair, précis et factuel {", emojis informatifs et pédagogiques" if use_emojis else ""}
+- Si Décontracté : style plus relâché, familier tout en restant poli {", emojis expressifs et amicaux" if use_emojis else ""}
+
+{email_format_instructions}"""
+
+
+def reformulation(preferences, text, context='', tone='Professionnel',
+                  format='Paragraphe', length='Moyen', use_emojis=False):
+    formatted_prompt = ''.join((
+        REFORMULATION_HEAD, context, REFORMULATION_TEXT, text,
+        _reformulation_tail(tone, format, length, bool(use_emojis))))
+    return preferences.system_prompt, formatted_prompt
+
+
+@lru_cache(maxsize=None)
+def _correction_system(flags, rules):
+    options = dict(zip(CORRECTION_OPTIONS, flags))
+    syntax_rules = dict(zip(SYNTAX_RULES, rules))
+    correction_prompt = "Tu es un correcteur de texte professionnel. Corrige le texte suivant en respectant les options sélectionnées:\n"
+    if options['grammar']:
+        correction_prompt += "- Correction grammaticale\n"
+    if options['spelling']:
+        correction_prompt += "- Correction orthographique\n"
+    if options['style']:
+        correction_prompt += "- Amélioration du style\n"
+    if options['punctuation']:
+        correction_prompt += "- Correction de la ponctuation\n"
+    if options['syntax']:
+        correction_prompt += "- Correction syntaxique avec les règles suivantes:\n"
+        if syntax_rules['word_order']:
+            correction_prompt += "  • Vérification de l'ordre des mots\n"
+        if syntax_rules['subject_verb_agreement']:
+            correction_prompt += "  • Accord sujet-verbe\n"
+        if syntax_rules['verb_tense']:
+            correction_prompt += "  • Temps verbaux\n"
+        if syntax_rules['gender_number']:
+            correction_prompt += "  • Accord en genre et nombre\n"
+        if syntax_rules['relative_pronouns']:
+            correction_prompt += "  • Pronoms relatifs\n"
+
+    if options['synonyms']:
+        correction_prompt += """
+Format de réponse avec synonymes:
+===TEXTE CORRIGÉ===
+[Le texte corrigé]
+===SYNONYMES===
+mot1: synonyme1, synonyme2, synonyme3
+mot2: synonyme1, synonyme2, synonyme3
+Veuillez inclure des suggestions de synonymes."""
+    else:
+        correction_prompt += "\nRetourne UNIQUEMENT le texte corrigé, sans aucun autre commentaire."
+    return correction_prompt
+
+
+def correction(text, options):
+    rules = options.get('syntax_rules') or {} if options.get('syntax') else {}
+    # Plain tuples keep the cache key cheap to build
+    system = _correction_system(
+        (bool(options.get('grammar')), bool(options.get('spelling')),
+         bool(options.get('style')), bool(options.get('punctuation')),
+         bool(options.get('syntax')), bool(options.get('synonyms'))),
+        (bool(rules.get('word_order')),
+         bool(rules.get('subject_verb_agreement')),
+         bool(rules.get('verb_tense')), bool(rules.get('gender_number')),
+         bool(rules.get('relative_pronouns'))))
+    return system, "Texte à corriger: " + text
+
+
+class PromptTemplates:
+    """Renderings of the stored prompts, cached per preferences version."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version = None
+        self._translation = {}
+
+    def sync(self, preferences):
+        """Drop the renderings if the preferences changed."""
+        if preferences.version != self._version:
+            with self._lock:
+                self._translation = {}
+                self._version = preferences.version
+
+    def translation_system(self, preferences, target_language):
+        self.sync(preferences)
+        system = self._translation.get(target_language)
+        if system is None:
+            system = preferences.translation_prompt.format(
+                target_language=target_language)
+            with self._lock:
+                if len(self._translation) >= self.max_entries:
+                    self._translation.clear()
+                self._translation[target_language] = system
+        return system
+
+
+templates = PromptTemplates()
+
+
+def translation(preferences, text, target_language):
+    return (templates.translation_system(preferences, target_language),
+            "Text: " + text)
+
+
+@lru_cache(maxsize=256)
+def _email_tail(email_type, tone):
+    return f"""
+
+Instructions spécifiques:
+- Format: Email professionnel
+- Type spécifique: {email_type}
+- Ton désiré: {tone} (IMPORTANT: Adapter strictement le ton)
+- Structure: Objet, Salutation, Corps du message, Formule de politesse, Signature
+- Contenu: Développer le contenu en incluant les points importants de "Contenu à inclure"
+- Mise en forme: Paragraphes clairs, concis et espacés. L'objet doit être concis et informatif.
+
+Instructions spécifiques pour le ton {tone}:
+- Si Professionnel : langage soutenu, formel et courtois
+- Si Informatif : style clair, précis et factuel
+- Si Décontracté : style plus relâché, familier tout en restant poli
+
+Exemple de structure:
+
+Objet: [Sujet clair et concis]
+
+Cher/Chère [Nom du destinataire],
+
+[Corps du message, bien structuré en paragraphes]
+
+Cordialement,
+
+[Nom de l'expéditeur]
+"""
+
+
+def email(preferences, email_type, content, sender='', tone='Professionnel'):
+    formatted_prompt = ''.join((
+        "Type d'email: ", email_type, "\nContenu à inclure: ", content,
+        "\nExpéditeur: ", sender, _email_tail(email_type, tone)))
+    return preferences.email_prompt, formatted_prompt
@@ -0,0 +1,148 @@
+"""Long-lived, pooled clients for the AI providers.
+
+Building a new ``OpenAI``/``Anthropic`` client per request means a fresh
+connection pool and TLS handshake every time. ``ClientRegistry`` keys clients
+by ``(provider, api_key, base_url)`` and keeps them, and their keep-alive
+pools, for the life of the process.
+
+The provider SDKs (and ``httpx``, which only they use) are imported when the
+first client of that provider is built: a deployment using a single provider
+does not pay the import time and memory of the others, and the Gemini SDK
+alone pulls in gRPC and protobuf.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Providers exposing an OpenAI-compatible API on a custom base URL
+OPENAI_COMPATIBLE_BASE_URLS = {
+    'openai': None,
+    'groq': "https://api.groq.com/openai/v1",
+    'deepseek': "https://api.deepseek.com/v1",
+    'openrouter': "https://openrouter.ai/api/v1",
+}
+
+
+class ClientRegistry:
+    """Thread-safe cache of provider clients sharing sized HTTP pools.
+
+    Only one set of credentials is kept per provider: requesting a client
+    with a new key drops the clients built for the previous one. They are not
+    closed, since requests started with them may still be running: their
+    pools are released when the last of those requests lets go of them.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=60.0, connect_timeout=10.0,
+                 read_timeout=120.0, timeouts=None):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # provider -> (connect, read) overriding the defaults above
+        self.timeouts = dict(timeouts or {})
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._gemini_key = None
+        self._session = None
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry)
+
+    def timeout(self, provider):
+        """``(connect, read)`` deadlines in seconds for ``provider``."""
+        return self.timeouts.get(provider,
+                                 (self.connect_timeout, self.read_timeout))
+
+    def _http_client(self, provider):
+        import httpx
+        connect, read = self.timeout(provider)
+        return httpx.Client(limits=self._limits(),
+                            timeout=httpx.Timeout(read, connect=connect))
+
+    def _get(self, provider, api_key, base_url, factory):
+        key = (provider, api_key, base_url)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                self._evict_locked(provider)
+                client = factory()
+                self._clients[key] = client
+            return client
+
+    def openai(self, provider, api_key):
+        base_url = OPENAI_COMPATIBLE_BASE_URLS.get(provider)
+
+        def factory():
+            from openai import OpenAI
+            return OpenAI(api_key=api_key,
+                          base_url=base_url,
+                          # Retries are handled by the GenerationEngine
+                          max_retries=0,
+                          http_client=self._http_client(provider))
+        return self._get(provider, api_key, base_url, factory)
+
+    def anthropic(self, api_key):
+        def factory():
+            from anthropic import Anthropic
+            return Anthropic(api_key=api_key,
+                             max_retries=0,
+                             http_client=self._http_client('anthropic'))
+        return self._get('anthropic', api_key, None, factory)
+
+    def gemini(self, api_key):
+        import google.generativeai as genai
+        # The Gemini SDK is configured globally; only reconfigure on change
+        with self._lock:
+            if api_key != self._gemini_key:
+                genai.configure(api_key=api_key)
+                self._gemini_key = api_key
+        return genai
+
+    @property
+    def session(self):
+        """Shared ``requests`` session for plain HTTP calls (Ollama, model lists)."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.max_keepalive_connections,
+                        pool_maxsize=self.max_connections)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def evict(self, provider=None):
+        """Drop cached clients, for one provider or all of them, without closing
+        them: in-flight calls may still be using them."""
+        with self._lock:
+            self._evict_locked(provider)
+
+    def _evict_locked(self, provider):
+        for key in [k for k in self._clients if provider in (None, k[0])]:
+            # Closing here would break calls still streaming on this client
+            del self._clients[key]
+        if provider in (None, 'gemini'):
+            self._gemini_key = None
+
+
+def parse_timeouts(value):
+    """Parse ``"ollama=5:600,openai=10:60"`` into ``{provider: (connect, read)}``."""
+    timeouts = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            provider, deadlines = item.split('=', 1)
+            connect, read = deadlines.split(':', 1)
+            timeouts[provider.strip()] = (float(connect), float(read))
+    return timeouts
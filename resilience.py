@@ -0,0 +1,138 @@
+"""Retry and circuit breaking for provider calls.
+
+Transient failures (timeouts, dropped connections, 429 and 5xx answers) are
+retried with jittered exponential backoff. A provider that keeps failing is
+put behind an open circuit: calls fail fast with ``CircuitOpen`` for
+``reset_timeout`` seconds instead of tying up workers, then a single trial
+call decides whether it is closed again.
+"""
+import random
+import threading
+import time
+
+from scheduler import Overloaded
+
+# Exception class names raised by the HTTP libraries and provider SDKs for
+# failures worth retrying, so that the SDKs need not be imported here
+TRANSIENT_ERRORS = {
+    'ConnectionError', 'ConnectTimeout', 'ReadTimeout', 'Timeout',
+    'ChunkedEncodingError', 'TimeoutException', 'ConnectError', 'ReadError',
+    'RemoteProtocolError', 'APIConnectionError', 'APITimeoutError',
+    'RateLimitError', 'InternalServerError', 'OverloadedError',
+    'ServiceUnavailable', 'DeadlineExceeded', 'ResourceExhausted',
+    'TooManyRequests', 'GatewayTimeout',
+}
+
+
+class ProviderHTTPError(Exception):
+    """A provider answered with an unexpected HTTP status."""
+
+    def __init__(self, provider, status_code, message='', retry_after=None):
+        super().__init__(f"{provider} returned HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Overloaded):
+    def __init__(self, provider, retry_after):
+        super().__init__(provider, retry_after)
+        self.args = (f"{provider} is unavailable, retry in {retry_after}s",)
+
+
+def is_transient(error):
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after_hint(error):
+    """Seconds the provider asked us to wait, when it said so."""
+    if getattr(error, 'retry_after', None) is not None:
+        return error.retry_after
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter") for transient errors."""
+
+    def __init__(self, retries=2, base_delay=0.5, max_delay=8.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error, attempt):
+        return attempt < self.retries and is_transient(error)
+
+    def delay(self, error, attempt):
+        hint = retry_after_hint(error)
+        if hint is not None:
+            return min(hint, self.max_delay)
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-provider circuit: closed, open after repeated failures, half-open."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def _circuit(self, provider):
+        return self._circuits.setdefault(provider, {
+            'failures': 0,
+            'opened_at': None,
+            'trial': False,
+            'trips': 0
+        })
+
+    def check(self, provider):
+        """Raise ``CircuitOpen`` unless a call to ``provider`` may proceed."""
+        with self._lock:
+            circuit = self._circuit(provider)
+            if circuit['opened_at'] is None:
+                return
+            remaining = circuit['opened_at'] + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not circuit['trial']:
+                # Half-open: let one trial call through
+                circuit['trial'] = True
+                return
+            raise CircuitOpen(provider, max(1, round(remaining)))
+
+    def record_success(self, provider):
+        with self._lock:
+            circuit = self._circuit(provider)
+            circuit.update(failures=0, opened_at=None, trial=False)
+
+    def record_failure(self, provider):
+        with self._lock:
+            circuit = self._circuit(provider)
+            circuit['failures'] += 1
+            if circuit['trial'] or circuit['failures'] >= self.failure_threshold:
+                if circuit['opened_at'] is None or circuit['trial']:
+                    circuit['trips'] += 1
+                circuit.update(opened_at=time.monotonic(), trial=False)
+
+    def release(self, provider):
+        """End a trial call that neither succeeded nor failed transiently."""
+        with self._lock:
+            self._circuit(provider)['trial'] = False
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {provider: {
+                "state": ('closed' if circuit['opened_at'] is None else
+                          'half-open' if circuit['trial'] else 'open'),
+                "failures": circuit['failures'],
+                "trips": circuit['trips'],
+                "open_for": (max(0.0, circuit['opened_at'] + self.reset_timeout - now)
+                             if circuit['opened_at'] is not None else 0.0)
+            } for provider, circuit in self._circuits.items()}
@@ -0,0 +1,189 @@
+"""History retention: archival of old rows and database compaction.
+
+History tables used to grow forever in the database that serves every
+request. ``RetentionJob`` periodically expires rows older than ``max_age_days``
+or beyond the newest ``max_rows`` of each type. Expired rows are appended to
+gzip-compressed JSONL archives before being deleted in small chunks, so the
+write lock is only held briefly, and freed pages are then returned to the
+file system with SQLite's incremental vacuum. Switching an existing database
+to incremental vacuum needs a full ``VACUUM``, which locks it for as long as
+it takes: that is an explicit offline step (``enable_incremental_vacuum``,
+``flask --app app enable-incremental-vacuum``), never done by the job.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, text
+
+from models import (db, ReformulationHistory, EmailHistory, CorrectionHistory,
+                    TranslationHistory)
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+HISTORY_MODELS = {
+    'reformulation': ReformulationHistory,
+    'email': EmailHistory,
+    'correction': CorrectionHistory,
+    'translation': TranslationHistory,
+}
+
+
+class RetentionJob:
+    """Periodic expiry, archival and compaction of the history tables."""
+
+    def __init__(self, app, max_age_days=None, max_rows=None,
+                 archive_dir='history_archive', interval=3600, chunk_size=500,
+                 vacuum_pages=2000, search=None):
+        self.app = app
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.vacuum_pages = vacuum_pages
+        self.search = search
+        self.last_run = None
+        self._vacuum_hint = False
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.max_age_days or self.max_rows)
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name='history-retention')
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Error in history retention: {str(e)}")
+            time.sleep(self.interval)
+
+    def run(self):
+        """Expire, archive and compact once; returns the rows removed per type."""
+        with self._exclusive() as acquired:
+            if not acquired:
+                return None
+            with self.app.app_context():
+                removed = {history_type: self._expire(history_type, model)
+                           for history_type, model in HISTORY_MODELS.items()}
+                compacted = self._compact() if any(removed.values()) else False
+            self.last_run = {
+                "finished_at": datetime.utcnow().isoformat(),
+                "removed": removed,
+                "compacted": compacted
+            }
+            return removed
+
+    @contextmanager
+    def _exclusive(self):
+        """Only one process runs the job at a time (others skip the run)."""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(os.path.join(self.archive_dir, '.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            yield True
+
+    def _expired_condition(self, model):
+        conditions = []
+        if self.max_age_days:
+            cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+            conditions.append(model.created_at < cutoff)
+        if self.max_rows:
+            # Newest row beyond the limit: it and everything older expire
+            boundary = db.session.query(model.created_at, model.id).order_by(
+                model.created_at.desc(), model.id.desc()).offset(
+                    self.max_rows).limit(1).first()
+            if boundary is not None:
+                conditions.append(or_(
+                    model.created_at < boundary.created_at,
+                    and_(model.created_at == boundary.created_at,
+                         model.id <= boundary.id)))
+        return or_(*conditions) if conditions else None
+
+    def _expire(self, history_type, model):
+        condition = self._expired_condition(model)
+        if condition is None:
+            return 0
+        archive = os.path.join(
+            self.archive_dir,
+            f"{history_type}-{datetime.utcnow():%Y%m%d-%H%M%S}.jsonl.gz")
+        removed = 0
+        while True:
+            rows = model.query.filter(condition).order_by(
+                model.id).limit(self.chunk_size).all()
+            if not rows:
+                return removed
+            # Archive first: a crash between the two steps duplicates rows in
+            # the archive rather than losing them
+            with gzip.open(archive, 'at', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row.to_dict(), ensure_ascii=False) + '\n')
+            model.query.filter(model.id.in_([row.id for row in rows])).delete(
+                synchronize_session=False)
+            db.session.commit()
+            db.session.expunge_all()
+            removed += len(rows)
+            # Let request writers take the lock between chunks
+            time.sleep(0)
+
+    def _compact(self):
+        """Optimize the search index and free pages; True if pages were freed."""
+        if self.search is not None:
+            self.search.optimize(db.engine)
+        if db.engine.dialect.name != 'sqlite':
+            return False
+        if not incremental_vacuum_enabled():
+            if not self._vacuum_hint:
+                print("History retention: freed pages stay in the database "
+                      "until 'flask --app app enable-incremental-vacuum' is run")
+                self._vacuum_hint = True
+            return False
+        # executescript() steps the pragma to completion; execute() would
+        # only free a single page
+        connection = db.engine.raw_connection()
+        try:
+            connection.driver_connection.executescript(
+                f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})')
+        finally:
+            connection.close()
+        return True
+
+
+def incremental_vacuum_enabled():
+    with db.engine.connect() as conn:
+        return conn.execute(text('PRAGMA auto_vacuum')).scalar() == 2
+
+
+def enable_incremental_vacuum():
+    """Switch SQLite to incremental auto-vacuum with a full VACUUM.
+
+    The database is locked for the whole VACUUM: run it with the application
+    stopped. Returns False when there was nothing to do.
+    """
+    if db.engine.dialect.name != 'sqlite' or incremental_vacuum_enabled():
+        return False
+    with db.engine.connect() as conn:
+        conn.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        conn.execute(text('VACUUM'))
+    return True
@@ -0,0 +1,173 @@
+"""Provider failover and hedged requests.
+
+``current_provider`` used to be the only provider ever called. The engine now
+walks an ordered chain (the current provider, then the fallbacks configured
+for the operation) and moves on when a provider fails before producing any
+text. With hedging on, the next provider is also started when the first one
+has not produced a token within its observed p95 time to first token; the
+first to answer wins and the other call is abandoned.
+"""
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+import tracing
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples per provider."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, provider, seconds):
+        with self._lock:
+            samples = self._samples.get(provider)
+            if samples is None:
+                samples = self._samples[provider] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, provider, percentile, min_samples=20):
+        """The ``percentile`` of the samples, or None while there are too few."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1,
+                    math.ceil(percentile / 100 * len(samples)) - 1)
+        return samples[max(index, 0)]
+
+    def stats(self):
+        with self._lock:
+            providers = list(self._samples)
+        return {provider: {
+            "samples": len(self._samples[provider]),
+            "p50": self.percentile(provider, 50, 1),
+            "p95": self.percentile(provider, 95, 1),
+            "p99": self.percentile(provider, 99, 1)
+        } for provider in providers}
+
+
+def hedge_delay(settings, latency, provider):
+    """Seconds to wait for a first token before hedging, or None if disabled."""
+    if not settings.get('enabled'):
+        return None
+    min_delay = settings.get('min_delay', 1.0)
+    max_delay = settings.get('max_delay', 10.0)
+    observed = latency.percentile(provider, settings.get('percentile', 95),
+                                  settings.get('min_samples', 20))
+    if observed is None:
+        return max_delay
+    return min(max(observed, min_delay), max_delay)
+
+
+def failover(streams, on_winner=None):
+    """Yield the tokens of the first stream that produces any.
+
+    ``streams`` are zero-argument callables returning token iterators, tried
+    in order; a stream failing after its first token is not replaced. The
+    error of the first stream is raised if they all fail. ``on_winner`` is
+    called with the index of the stream followed, at its first token.
+    """
+    errors = []
+    for index, make_stream in enumerate(streams):
+        started = False
+        try:
+            for token in make_stream():
+                if not started and on_winner is not None:
+                    on_winner(index)
+                started = True
+                yield token
+            if started:
+                return
+            raise Exception("Empty response")
+        except Exception as e:
+            if started:
+                raise
+            errors.append(e)
+    raise errors[0]
+
+
+def race(streams, delay, on_winner=None):
+    """Like ``failover()``, but starts the next stream after ``delay`` seconds
+    without a first token, and follows whichever stream answers first.
+
+    Streams run in worker threads; the ones that lose are told to stop at
+    their next token, which closes them and frees their resources.
+    """
+    events = queue.Queue()
+    cancelled = [threading.Event() for _ in streams]
+    running = set()
+    errors = {}
+
+    def consume(index):
+        stream = iter(())
+        try:
+            stream = streams[index]()
+            for token in stream:
+                if cancelled[index].is_set():
+                    return
+                events.put((index, 'token', token))
+            events.put((index, 'done', None))
+        except Exception as e:
+            events.put((index, 'error', e))
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    def start(index):
+        running.add(index)
+        threading.Thread(target=tracing.bind(consume), args=(index,),
+                         daemon=True).start()
+
+    start(0)
+    next_index = 1
+    hedged = False
+    winner = None
+    deadline = time.monotonic() + delay
+    try:
+        while True:
+            timeout = None
+            if winner is None and not hedged and next_index < len(streams):
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                index, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                # First token is late: hedge with the next provider
+                hedged = True
+                start(next_index)
+                next_index += 1
+                continue
+
+            if winner is None:
+                if kind == 'token':
+                    winner = index
+                    if on_winner is not None:
+                        on_winner(index)
+                    for other in running - {index}:
+                        cancelled[other].set()
+                    yield value
+                    continue
+                running.discard(index)
+                errors[index] = value if kind == 'error' else Exception(
+                    "Empty response")
+                if not running:
+                    if next_index >= len(streams):
+                        raise errors[min(errors)]
+                    start(next_index)
+                    next_index += 1
+                    deadline = time.monotonic() + delay
+            elif index == winner:
+                if kind == 'token':
+                    yield value
+                elif kind == 'done':
+                    return
+                else:
+                    raise value
+    finally:
+        for event in cancelled:
+            event.set()
@@ -0,0 +1,132 @@
+"""Admission control in front of the provider calls.
+
+A local Ollama model serves one or two generations at a time and remote APIs
+answer bursts with 429s, so letting every request through at once makes all
+of them slow or fail. ``ProviderScheduler`` caps the calls in flight per
+provider/model; extra calls wait in a bounded FIFO queue and are rejected
+right away with ``Overloaded`` (an HTTP 503 with ``Retry-After``) once the
+queue is full or the wait would be too long.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is busy, retry in {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class _Slots:
+    """Concurrency state of one provider/model."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters = deque()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_seconds = None
+
+
+class ProviderScheduler:
+    """Per provider/model concurrency limit with a bounded, fair wait queue.
+
+    ``limits`` maps ``"provider/model"`` or a provider name to the maximum
+    number of calls in flight for each of its models: a model's own entry
+    wins over its provider's, and ``default_limit`` applies to the others.
+    Freed slots are handed to the oldest waiter first.
+    """
+
+    def __init__(self, limits=None, default_limit=8, max_queue=32,
+                 queue_timeout=60):
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def _get_slots(self, provider, model):
+        key = (provider, model)
+        slots = self._slots.get(key)
+        if slots is None:
+            slots = self._slots[key] = _Slots(self.limits.get(
+                f"{provider}/{model}",
+                self.limits.get(provider, self.default_limit)))
+        return slots
+
+    def _retry_after(self, slots):
+        # Time for the queue ahead to drain, from the average call duration
+        average = slots.avg_seconds or 1.0
+        waves = (len(slots.waiters) + 1) / max(slots.limit, 1)
+        return max(1, math.ceil(average * waves))
+
+    @contextmanager
+    def slot(self, provider, model):
+        """Hold one call slot for ``provider``/``model`` during the block."""
+        with self._lock:
+            slots = self._get_slots(provider, model)
+            if slots.in_flight < slots.limit and not slots.waiters:
+                slots.in_flight += 1
+                waiter = None
+            elif len(slots.waiters) >= self.max_queue:
+                slots.rejected += 1
+                raise Overloaded(provider, self._retry_after(slots))
+            else:
+                waiter = threading.Event()
+                slots.waiters.append(waiter)
+
+        if waiter is not None and not waiter.wait(self.queue_timeout):
+            with self._lock:
+                # The slot may have been handed over right after the timeout
+                if not waiter.is_set():
+                    slots.waiters.remove(waiter)
+                    slots.timed_out += 1
+                    raise Overloaded(provider, self._retry_after(slots))
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                slots.completed += 1
+                slots.avg_seconds = elapsed if slots.avg_seconds is None else (
+                    0.8 * slots.avg_seconds + 0.2 * elapsed)
+                if slots.waiters:
+                    # Hand the slot over directly so that it cannot be taken
+                    # by a newcomer ahead of the queue
+                    slots.waiters.popleft().set()
+                else:
+                    slots.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return [{
+                "provider": provider,
+                "model": model,
+                "limit": slots.limit,
+                "in_flight": slots.in_flight,
+                "queued": len(slots.waiters),
+                "completed": slots.completed,
+                "rejected": slots.rejected,
+                "timed_out": slots.timed_out,
+                "avg_seconds": slots.avg_seconds
+            } for (provider, model), slots in self._slots.items()]
+
+
+def parse_limits(value):
+    """Parse ``"ollama=2,openai=16,openai/gpt-4o=4"`` into ``{'ollama': 2,
+    'openai': 16, 'openai/gpt-4o': 4}``; model names may contain ``/``."""
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, limit = item.rsplit('=', 1)
+            limits[name.strip()] = int(limit)
+    return limits
@@ -0,0 +1,159 @@
+"""Full-text search over the history tables with SQLite FTS5.
+
+``history_search`` is an FTS5 table holding one row per history entry: the
+source text and the generated text of every reformulation, email, correction
+and translation. Triggers on the history tables keep it up to date on insert
+and delete, so entries are indexed in the same transaction that stores them,
+whatever code path inserts them. The FTS rowid is derived from the history
+type and entry id, so that the delete trigger is a rowid lookup rather than
+a scan of the whole index.
+"""
+from markupsafe import escape
+from sqlalchemy import text
+
+FTS_TABLE = 'history_search'
+
+# history type -> (table, source text column, generated text column)
+INDEXED_TABLES = {
+    'reformulation': ('reformulation_history', 'original_text', 'reformulated_text'),
+    'email': ('email_history', 'content', 'generated_email'),
+    'correction': ('correction_history', 'original_text', 'corrected_text'),
+    'translation': ('translation_history', 'original_text', 'translated_text'),
+}
+
+# history type -> position in the FTS rowid: rowid = id * ROWID_STRIDE + index
+TYPE_INDEX = {'reformulation': 0, 'email': 1, 'correction': 2, 'translation': 3}
+ROWID_STRIDE = 4
+
+# Control characters used as highlight markers, replaced by <mark> once the
+# snippet has been HTML-escaped
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+class HistorySearch:
+    """Ranked full-text search over every history type."""
+
+    def __init__(self, snippet_tokens=16):
+        self.snippet_tokens = snippet_tokens
+        self.available = False
+
+    def setup(self, engine):
+        """Create the FTS table and its triggers, indexing existing rows once.
+
+        Search stays disabled on databases other than SQLite and on SQLite
+        builds compiled without FTS5.
+        """
+        if engine.dialect.name != 'sqlite':
+            return False
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}).first() is not None
+            if exists and self._outdated(conn):
+                self._drop(conn)
+                exists = False
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "history_type UNINDEXED, entry_id UNINDEXED, created_at UNINDEXED, "
+                    "source, result, tokenize = 'unicode61 remove_diacritics 2')"))
+            except Exception as e:
+                print(f"Full-text search disabled: {str(e)}")
+                return False
+            for history_type, (table, source, result) in INDEXED_TABLES.items():
+                index = TYPE_INDEX[history_type]
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert "
+                    f"AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {FTS_TABLE} (rowid, history_type, entry_id, created_at, source, result) "
+                    f"VALUES (new.id * {ROWID_STRIDE} + {index}, '{history_type}', new.id, "
+                    f"new.created_at, new.{source}, new.{result}); "
+                    "END"))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete "
+                    f"AFTER DELETE ON {table} BEGIN "
+                    f"DELETE FROM {FTS_TABLE} "
+                    f"WHERE rowid = old.id * {ROWID_STRIDE} + {index}; "
+                    "END"))
+                if not exists:
+                    conn.execute(text(
+                        f"INSERT INTO {FTS_TABLE} (rowid, history_type, entry_id, created_at, source, result) "
+                        f"SELECT id * {ROWID_STRIDE} + {index}, '{history_type}', id, "
+                        f"created_at, {source}, {result} FROM {table}"))
+        self.available = True
+        return True
+
+    @staticmethod
+    def _outdated(conn):
+        """True for an index built before rowids were derived from the entries."""
+        sql = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+            {'name': f"{INDEXED_TABLES['reformulation'][0]}_search_delete"}).scalar()
+        return sql is not None and 'rowid' not in sql
+
+    @staticmethod
+    def _drop(conn):
+        for table, _, _ in INDEXED_TABLES.values():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_insert"))
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_delete"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+    def optimize(self, engine):
+        """Merge the index segments, e.g. after many deletes."""
+        if not self.available:
+            return
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+
+    @staticmethod
+    def match_expression(query):
+        """Turn free user input into an FTS5 query.
+
+        Every word is quoted so that FTS5 operators typed by the user are
+        matched literally, and the last word is a prefix so results show up
+        while typing.
+        """
+        terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+        if not terms:
+            return None
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def highlight(self, snippet):
+        return str(escape(snippet or '')).replace(
+            MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+    def search(self, session, query, history_type=None, limit=20, offset=0):
+        """Return one page of results, best match first, plus a ``has_more`` flag."""
+        expression = self.match_expression(query)
+        if expression is None:
+            return [], False
+        sql = (
+            f"SELECT history_type, entry_id, created_at, bm25({FTS_TABLE}) AS score, "
+            f"snippet({FTS_TABLE}, -1, :mark_start, :mark_end, '…', :tokens) AS snippet "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression")
+        params = {
+            'expression': expression,
+            'mark_start': MARK_START,
+            'mark_end': MARK_END,
+            'tokens': self.snippet_tokens,
+            'limit': limit + 1,
+            'offset': offset
+        }
+        if history_type:
+            sql += " AND history_type = :history_type"
+            params['history_type'] = history_type
+        sql += " ORDER BY score, created_at DESC LIMIT :limit OFFSET :offset"
+        rows = session.execute(text(sql), params).all()
+
+        results = [{
+            'type': row.history_type,
+            'id': row.entry_id,
+            # Stored as SQLite text; match the isoformat() of to_dict()
+            'created_at': row.created_at and row.created_at.replace(' ', 'T', 1),
+            'score': row.score,
+            'snippet': self.highlight(row.snippet)
+        } for row in rows[:limit]]
+        return results, len(rows) > limit
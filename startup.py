@@ -0,0 +1,58 @@
+"""Process startup helpers for multi-worker deployments.
+
+Every worker process imports ``app``. The session secret must then be the
+same in all of them (and survive restarts), and the schema upgrade must not
+run concurrently in several workers.
+"""
+import os
+import secrets
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+
+def secret_key(path):
+    """``SECRET_KEY`` from the environment, else a key generated once in ``path``."""
+    key = os.getenv('SECRET_KEY')
+    if key:
+        return key
+    try:
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Written aside then linked into place, so that a worker starting at the
+    # same time either wins or reads the complete key of the one that did
+    temporary = f"{path}.{os.getpid()}"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(temporary, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporary)
+    with open(path) as f:
+        return f.read().strip()
+
+
+@contextmanager
+def exclusive(path):
+    """Hold an exclusive lock on ``path``, waiting for other processes."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
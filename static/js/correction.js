@@ -92,31 +92,22 @@ document.addEventListener('DOMContentLoaded', function() {
             synonymsContainer.style.display = 'none';
 
             try {
-                const response = await fetch('/api/correct', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        text: text,
-                        options: options
-                    })
+                const result = await streamGeneration('/api/correct', {
+                    text: text,
+                    options: options
+                }, partial => {
+                    // Hide the synonyms block until the stream completes
+                    correctionOutput.value = parseResponse(partial).text;
                 });
 
-                const data = await response.json();
-                if (data.error) {
-                    correctionOutput.value = `Erreur: ${data.error}`;
-                    synonymsContainer.style.display = 'none';
+                const { text: correctedText, synonyms } = parseResponse(result);
+                correctionOutput.value = correctedText;
+                updateTextStats(correctionOutput.value, 'correctionOutputCharCount', 'correctionOutputWordCount', 'correctionOutputParaCount');
+
+                if (options.synonyms) {
+                    displaySynonyms(synonyms);
                 } else {
-                    const { text: correctedText, synonyms } = parseResponse(data.text);
-                    correctionOutput.value = correctedText;
-                    updateTextStats(correctionOutput.value, 'correctionOutputCharCount', 'correctionOutputWordCount', 'correctionOutputParaCount');
-                    
-                    if (options.synonyms) {
-                        displaySynonyms(synonyms);
-                    } else {
-                        synonymsContainer.style.display = 'none';
-                    }
+                    synonymsContainer.style.display = 'none';
                 }
             } catch (error) {
                 correctionOutput.value = `Erreur: ${error.message}`;
@@ -163,57 +154,58 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Handle reuse correction button
-    document.querySelectorAll('.reuse-correction').forEach(button => {
-        button.addEventListener('click', function(e) {
-            e.preventDefault();
-            e.stopPropagation();
+    // Delegated so that lazily loaded history entries are handled too
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.reuse-correction');
+        if (!button) return;
+        e.preventDefault();
+        e.stopPropagation();
+        
+        const correctionTab = document.querySelector('#correction-tab');
+        if (correctionTab) {
+            correctionTab.click();
             
-            const correctionTab = document.querySelector('#correction-tab');
-            if (correctionTab) {
-                correctionTab.click();
-                
-                // Wait for the tab transition
-                setTimeout(() => {
-                    const correctionInput = document.getElementById('correctionInput');
-                    if (correctionInput) {
-                        correctionInput.value = this.dataset.text || '';
-                        updateTextStats(correctionInput.value, 'correctionInputCharCount', 'correctionInputWordCount', 'correctionInputParaCount');
-                    }
+            // Wait for the tab transition
+            setTimeout(() => {
+                const correctionInput = document.getElementById('correctionInput');
+                if (correctionInput) {
+                    correctionInput.value = button.dataset.text || '';
+                    updateTextStats(correctionInput.value, 'correctionInputCharCount', 'correctionInputWordCount', 'correctionInputParaCount');
+                }
 
-                    // Reset correction output
-                    const correctionOutput = document.getElementById('correctionOutput');
-                    if (correctionOutput) {
-                        correctionOutput.value = '';
-                        updateTextStats(correctionOutput.value, 'correctionOutputCharCount', 'correctionOutputWordCount', 'correctionOutputParaCount');
-                    }
-                    
-                    // Set correction options if they exist
-                    if (this.dataset.corrections) {
-                        try {
-                            const corrections = JSON.parse(this.dataset.corrections);
-                            if (corrections) {
-                                ['checkSyntax', 'checkGrammar', 'checkSpelling', 'checkStyle', 'checkPunctuation', 'checkSynonyms'].forEach(id => {
+                // Reset correction output
+                const correctionOutput = document.getElementById('correctionOutput');
+                if (correctionOutput) {
+                    correctionOutput.value = '';
+                    updateTextStats(correctionOutput.value, 'correctionOutputCharCount', 'correctionOutputWordCount', 'correctionOutputParaCount');
+                }
+                
+                // Set correction options if they exist
+                if (button.dataset.corrections) {
+                    try {
+                        const corrections = JSON.parse(button.dataset.corrections);
+                        if (corrections) {
+                            ['checkSyntax', 'checkGrammar', 'checkSpelling', 'checkStyle', 'checkPunctuation', 'checkSynonyms'].forEach(id => {
+                                const checkbox = document.getElementById(id);
+                                if (checkbox) {
+                                    checkbox.checked = corrections[id.replace('check', '').toLowerCase()] || false;
+                                }
+                            });
+                            
+                            if (corrections.syntax_rules) {
+                                ['wordOrder', 'subjectVerb', 'verbTense', 'genderNumber', 'relativePronouns'].forEach(id => {
                                     const checkbox = document.getElementById(id);
                                     if (checkbox) {
-                                        checkbox.checked = corrections[id.replace('check', '').toLowerCase()] || false;
+                                        checkbox.checked = corrections.syntax_rules[id.toLowerCase()] || false;
                                     }
                                 });
-                                
-                                if (corrections.syntax_rules) {
-                                    ['wordOrder', 'subjectVerb', 'verbTense', 'genderNumber', 'relativePronouns'].forEach(id => {
-                                        const checkbox = document.getElementById(id);
-                                        if (checkbox) {
-                                            checkbox.checked = corrections.syntax_rules[id.toLowerCase()] || false;
-                                        }
-                                    });
-                                }
                             }
-                        } catch (error) {
-                            console.error('Error parsing corrections:', error);
                         }
+                    } catch (error) {
+                        console.error('Error parsing corrections:', error);
                     }
-                }, 150);
-            }
-        });
+                }
+            }, 150);
+        }
     });
 });
@@ -60,55 +60,46 @@ document.addEventListener('DOMContentLoaded', function() {
                 const selectedTone = window.getSelectedValues('emailToneGroup');
                 console.log('Email generation - Selected tone:', selectedTone);
                     
-                const response = await fetch('/api/generate-email', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        type: type,
-                        content: content,
-                        sender: sender,
-                        tone: Array.isArray(selectedTone) ? selectedTone[0] : selectedTone || 'Professionnel' // Handle both array and single value
-                    })
+                const result = await streamGeneration('/api/generate-email', {
+                    type: type,
+                    content: content,
+                    sender: sender,
+                    tone: Array.isArray(selectedTone) ? selectedTone[0] : selectedTone || 'Professionnel' // Handle both array and single value
+                }, partial => {
+                    emailOutput.value = partial;
                 });
 
-                const data = await response.json();
-                if (response.ok) {
-                    // Enhanced email parsing
-                    const lines = data.text.split('\n');
-                    const subjectLine = lines.find(line => 
-                        line.toLowerCase().startsWith('objet:') || 
-                        line.toLowerCase().startsWith('object:') ||
-                        line.toLowerCase().startsWith('sujet:')
-                    );
+                // Enhanced email parsing
+                const lines = result.split('\n');
+                const subjectLine = lines.find(line => 
+                    line.toLowerCase().startsWith('objet:') || 
+                    line.toLowerCase().startsWith('object:') ||
+                    line.toLowerCase().startsWith('sujet:')
+                );
+                
+                if (subjectLine && emailSubject) {
+                    // Extract subject, removing any prefix (Objet:, Object:, Sujet:)
+                    const subjectText = subjectLine.substring(subjectLine.indexOf(':') + 1).trim();
+                    emailSubject.value = subjectText;
                     
-                    if (subjectLine && emailSubject) {
-                        // Extract subject, removing any prefix (Objet:, Object:, Sujet:)
-                        const subjectText = subjectLine.substring(subjectLine.indexOf(':') + 1).trim();
-                        emailSubject.value = subjectText;
-                        
-                        // Format the email body with proper spacing
-                        if (emailOutput) {
-                            const bodyLines = lines
-                                .filter(line => !line.toLowerCase().match(/^(objet|object|sujet):/))
-                                .join('\n')
-                                .trim()
-                                // Ensure proper spacing between sections
-                                .replace(/\n{3,}/g, '\n\n');
-                            emailOutput.value = bodyLines;
-                        }
-                    } else {
-                        // Fallback if no subject is found
-                        if (emailSubject) emailSubject.value = "";
-                        if (emailOutput) emailOutput.value = data.text;
+                    // Format the email body with proper spacing
+                    if (emailOutput) {
+                        const bodyLines = lines
+                            .filter(line => !line.toLowerCase().match(/^(objet|object|sujet):/))
+                            .join('\n')
+                            .trim()
+                            // Ensure proper spacing between sections
+                            .replace(/\n{3,}/g, '\n\n');
+                        emailOutput.value = bodyLines;
                     }
                 } else {
-                    if (emailOutput) emailOutput.value = `Erreur: ${data.error || 'Une erreur est survenue'}`;
+                    // Fallback if no subject is found
+                    if (emailSubject) emailSubject.value = "";
+                    if (emailOutput) emailOutput.value = result;
                 }
             } catch (error) {
                 console.error('Erreur:', error);
-                if (emailOutput) emailOutput.value = "Erreur de connexion. Veuillez réessayer.";
+                if (emailOutput) emailOutput.value = `Erreur: ${error.message || 'Une erreur est survenue'}`;
             } finally {
                 generateEmail.disabled = false;
                 generateEmail.textContent = "Générer l'email";
@@ -0,0 +1,284 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const PAGE_SIZE = 10;
+    const EMPTY_MESSAGES = {
+        reformulation: 'Aucun historique de reformulation',
+        email: "Aucun historique d'email",
+        correction: 'Aucun historique de correction',
+        translation: 'Aucun historique de traduction'
+    };
+    // Next page cursor per history type; undefined until the first load
+    const cursors = {};
+    // Badges shown on a compact entry, from its metadata columns
+    const SUMMARY_FIELDS = {
+        reformulation: ['tone', 'format', 'length'],
+        email: ['email_type', 'sender'],
+        correction: [],
+        translation: ['source_language', 'target_language']
+    };
+
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value == null ? '' : String(value);
+        return div.innerHTML.replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    }
+
+    function renderEntry(type, entry) {
+        const e = escapeHtml;
+        let button = '';
+        let body = '';
+        switch (type) {
+            case 'reformulation':
+                button = `
+                    <button class="btn btn-sm btn-success reuse-history"
+                        data-context="${e(entry.context)}"
+                        data-text="${e(entry.original_text)}"
+                        data-tone="${e(entry.tone)}"
+                        data-format="${e(entry.format)}"
+                        data-length="${e(entry.length)}">
+                        Réutiliser
+                    </button>`;
+                body = `
+                    <div class="mb-2">
+                        <strong>Original:</strong>
+                        <pre class="mb-2">${e(entry.original_text)}</pre>
+                        ${entry.context ? `<strong>Contexte:</strong>
+                        <pre class="mb-2">${e(entry.context)}</pre>` : ''}
+                        <strong>Reformulation:</strong>
+                        <pre>${e(entry.reformulated_text)}</pre>
+                    </div>
+                    <div>
+                        <span class="badge bg-secondary me-1">${e(entry.tone)}</span>
+                        <span class="badge bg-secondary me-1">${e(entry.format)}</span>
+                        <span class="badge bg-secondary">${e(entry.length)}</span>
+                    </div>`;
+                break;
+            case 'email':
+                button = `
+                    <button class="btn btn-sm btn-success reuse-email"
+                        data-type="${e(entry.email_type)}"
+                        data-content="${e(entry.content)}"
+                        data-sender="${e(entry.sender)}">
+                        Réutiliser
+                    </button>`;
+                body = `
+                    <div>
+                        <strong>Type:</strong> ${e(entry.email_type)}<br>
+                        ${entry.sender ? `<strong>Expéditeur:</strong> ${e(entry.sender)}<br>` : ''}
+                        <strong>Contenu:</strong>
+                        <pre class="mb-2">${e(entry.content)}</pre>
+                        <strong>Email généré:</strong>
+                        <pre>${e(entry.generated_email)}</pre>
+                    </div>`;
+                break;
+            case 'correction': {
+                const corrections = entry.corrections || {};
+                button = `
+                    <button class="btn btn-sm btn-success reuse-correction"
+                        data-text="${e(entry.original_text)}"
+                        data-corrections="${e(JSON.stringify(corrections))}"
+                        data-type="correction">
+                        Réutiliser
+                    </button>`;
+                const details = Object.entries(corrections).map(([name, value]) => `
+                    <li><span class="badge bg-info">${e(name)}</span> ${e(typeof value === 'object' ? JSON.stringify(value) : value)}</li>`).join('');
+                body = `
+                    <div class="mb-2">
+                        <strong>Texte original:</strong>
+                        <pre class="mb-2">${e(entry.original_text)}</pre>
+                        <strong>Texte corrigé:</strong>
+                        <pre>${e(entry.corrected_text)}</pre>
+                    </div>
+                    <div>
+                        <strong>Corrections appliquées:</strong>
+                        <ul class="list-unstyled">${details}</ul>
+                    </div>`;
+                break;
+            }
+            case 'translation':
+                button = `
+                    <button class="btn btn-sm btn-success reuse-translation"
+                        data-text="${e(entry.original_text)}"
+                        data-target-language="${e(entry.target_language)}">
+                        Réutiliser
+                    </button>`;
+                body = `
+                    <div class="mb-2">
+                        <strong>Texte original:</strong>
+                        <pre class="mb-2">${e(entry.original_text)}</pre>
+                        <strong>Traduction (${e(entry.target_language)}):</strong>
+                        <pre>${e(entry.translated_text)}</pre>
+                    </div>
+                    ${entry.source_language ? `<div>
+                        <span class="badge bg-secondary">${e(entry.source_language)} ➔ ${e(entry.target_language)}</span>
+                    </div>` : ''}`;
+                break;
+        }
+
+        return `
+            <div class="list-group-item">
+                <div class="d-flex justify-content-between align-items-center mb-2">
+                    <small class="text-muted">${e(entry.created_at)}</small>
+                    ${button}
+                </div>
+                ${body}
+            </div>`;
+    }
+
+    // Pages only carry a preview; the full entry is fetched when opened
+    function renderSummary(type, entry) {
+        const e = escapeHtml;
+        const badges = SUMMARY_FIELDS[type]
+            .filter(name => entry[name])
+            .map(name => `<span class="badge bg-secondary me-1">${e(entry[name])}</span>`)
+            .join('');
+        return `
+            <div class="list-group-item" data-history-type="${e(type)}" data-entry-id="${e(entry.id)}">
+                <div class="d-flex justify-content-between align-items-center mb-2">
+                    <small class="text-muted">${e(entry.created_at)}</small>
+                    <div>
+                        <button class="btn btn-sm btn-outline-secondary me-1 expand-history">Afficher</button>
+                        <button class="btn btn-sm btn-success reuse-summary">Réutiliser</button>
+                    </div>
+                </div>
+                <pre class="mb-2">${e(entry.preview)}</pre>
+                ${badges ? `<div>${badges}</div>` : ''}
+            </div>`;
+    }
+
+    async function expandEntry(item) {
+        const response = await fetch(`/api/history/${item.dataset.historyType}/${item.dataset.entryId}`);
+        const entry = await response.json();
+        if (!response.ok) {
+            throw new Error(entry.error || 'Failed to load history entry');
+        }
+        item.insertAdjacentHTML('afterend', renderEntry(item.dataset.historyType, entry));
+        const expanded = item.nextElementSibling;
+        item.remove();
+        return expanded;
+    }
+
+    document.addEventListener('click', async (event) => {
+        const button = event.target.closest('.expand-history, .reuse-summary');
+        if (!button) return;
+        const item = button.closest('.list-group-item');
+        button.disabled = true;
+        try {
+            const expanded = await expandEntry(item);
+            if (button.classList.contains('reuse-summary')) {
+                // Handled by the page scripts listening for the full entry's button
+                expanded.querySelector('.btn-success').click();
+            }
+        } catch (error) {
+            console.error('Error loading history entry:', error);
+            button.disabled = false;
+        }
+    });
+
+    async function loadHistory(type) {
+        const list = document.querySelector(`.list-group[data-history-type="${type}"]`);
+        const more = document.querySelector(`.history-more[data-history-type="${type}"]`);
+        if (!list) return;
+
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (cursors[type]) {
+            params.set('cursor', cursors[type]);
+        }
+
+        try {
+            if (more) more.disabled = true;
+            const response = await fetch(`/api/history/${type}?${params}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to load history');
+            }
+
+            if (!cursors[type] && data.items.length === 0) {
+                list.innerHTML = `<p class="text-muted">${EMPTY_MESSAGES[type]}</p>`;
+            } else {
+                list.insertAdjacentHTML('beforeend', data.items.map(entry => renderSummary(type, entry)).join(''));
+            }
+            cursors[type] = data.next_cursor;
+            if (more) more.classList.toggle('d-none', !data.next_cursor);
+        } catch (error) {
+            console.error(`Error loading ${type} history:`, error);
+        } finally {
+            if (more) more.disabled = false;
+        }
+    }
+
+    // Load each section the first time it is expanded
+    document.querySelectorAll('#historyAccordion .accordion-collapse').forEach(section => {
+        const list = section.querySelector('.list-group[data-history-type]');
+        if (!list) return;
+        const type = list.dataset.historyType;
+        section.addEventListener('show.bs.collapse', () => {
+            if (!(type in cursors)) {
+                cursors[type] = null;
+                loadHistory(type);
+            }
+        });
+    });
+
+    document.querySelectorAll('.history-more').forEach(button => {
+        button.addEventListener('click', () => loadHistory(button.dataset.historyType));
+    });
+
+    // Full-text search
+    const TYPE_LABELS = {
+        reformulation: 'Reformulation',
+        email: 'Email',
+        correction: 'Correction',
+        translation: 'Traduction'
+    };
+    const searchInput = document.getElementById('historySearch');
+    const searchResults = document.getElementById('historySearchResults');
+    const searchMore = document.getElementById('historySearchMore');
+    let searchOffset = null;
+    let searchTimer = null;
+
+    async function searchHistory(append) {
+        const query = searchInput.value.trim();
+        if (!query) {
+            searchResults.innerHTML = '';
+            searchMore.classList.add('d-none');
+            return;
+        }
+        const params = new URLSearchParams({ q: query, limit: PAGE_SIZE });
+        if (append && searchOffset) {
+            params.set('offset', searchOffset);
+        }
+        try {
+            const response = await fetch(`/api/history/search?${params}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || 'Search failed');
+            }
+            // Snippets are escaped by the server, only <mark> is left as HTML
+            const html = data.items.map(item => `
+                <div class="list-group-item">
+                    <div class="d-flex justify-content-between align-items-center mb-1">
+                        <span class="badge bg-secondary">${TYPE_LABELS[item.type] || escapeHtml(item.type)}</span>
+                        <small class="text-muted">${escapeHtml(item.created_at)}</small>
+                    </div>
+                    <div>${item.snippet}</div>
+                </div>`).join('');
+            if (append) {
+                searchResults.insertAdjacentHTML('beforeend', html);
+            } else {
+                searchResults.innerHTML = html || '<p class="text-muted">Aucun résultat</p>';
+            }
+            searchOffset = data.next_offset;
+            searchMore.classList.toggle('d-none', !data.next_offset);
+        } catch (error) {
+            console.error('Error searching history:', error);
+        }
+    }
+
+    if (searchInput) {
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => searchHistory(false), 250);
+        });
+        searchMore.addEventListener('click', () => searchHistory(true));
+    }
+});
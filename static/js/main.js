@@ -53,6 +53,72 @@ function updateTextStats(text, charCountId, wordCountId, paraCountId) {
     });
 }
 
+// Stream a generation endpoint as Server-Sent Events.
+// onToken receives the text generated so far; resolves with the full text.
+async function streamGeneration(url, body, onToken) {
+    const response = await fetch(`${url}?stream=1`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify(body)
+    });
+
+    if (!response.ok) {
+        let message = 'Une erreur est survenue';
+        try {
+            const errorData = await response.json();
+            message = errorData.error || message;
+            if (response.status === 503 && errorData.retry_after) {
+                message = `Le fournisseur est occupé, réessayez dans ${errorData.retry_after} s`;
+            }
+        } catch (e) {
+            // Keep the generic message
+        }
+        throw new Error(message);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) continue;
+
+            const payload = JSON.parse(data);
+            if (event === 'error') {
+                throw new Error(payload.error);
+            }
+            if (event === 'done') {
+                return payload.text;
+            }
+            text += payload.token;
+            if (onToken) onToken(text);
+        }
+    }
+    return text;
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Navigation functionality with improved mobile handling
     const navbar = document.querySelector('.navbar-collapse');
@@ -422,77 +488,79 @@ document.addEventListener('DOMContentLoaded', function() {
         return groupId.includes('tone') ? activeTags : (activeTags[0] || '');
     }
 
-    document.querySelectorAll('.reuse-history').forEach(button => {
-        button.addEventListener('click', function(e) {
-            e.preventDefault();
+    // Delegated so that lazily loaded history entries are handled too
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.reuse-history');
+        if (!button) return;
+        e.preventDefault();
+        
+        const reformulationTab = document.querySelector('#reformulation-tab');
+        if (reformulationTab) {
+            const tab = new bootstrap.Tab(reformulationTab);
+            tab.show();
             
-            const reformulationTab = document.querySelector('#reformulation-tab');
-            if (reformulationTab) {
-                const tab = new bootstrap.Tab(reformulationTab);
-                tab.show();
+            // Wait for the tab transition
+            setTimeout(() => {
+                const contextText = document.getElementById('contextText');
+                const inputText = document.getElementById('inputText');
                 
-                // Wait for the tab transition
-                setTimeout(() => {
-                    const contextText = document.getElementById('contextText');
-                    const inputText = document.getElementById('inputText');
-                    
-                    if (contextText) {
-                        contextText.value = this.dataset.context || '';
-                        updateTextStats(contextText.value, 'contextCharCount', 'contextWordCount', 'contextParaCount');
-                    }
-                    
-                    if (inputText) {
-                        inputText.value = this.dataset.text || '';
-                        updateTextStats(inputText.value, 'inputCharCount', 'inputWordCount', 'inputParaCount');
-                    }
-                    
-                    function setActiveButton(groupId, value) {
-                        const buttons = document.querySelectorAll(`#${groupId} .btn`);
-                        buttons.forEach(btn => {
-                            if (btn.dataset.value === value) {
-                                btn.classList.add('active');
-                            } else {
-                                btn.classList.remove('active');
-                            }
-                        });
-                    }
-                    
-                    setActiveButton('toneGroup', this.dataset.tone);
-                    setActiveButton('formatGroup', this.dataset.format);
-                    setActiveButton('lengthGroup', this.dataset.length);
-                }, 150); // Short delay to ensure tab is fully shown
-            }
-            
-            const outputText = document.getElementById('outputText');
-            if (outputText) {
-                outputText.value = '';
-                updateTextStats('', 'outputCharCount', 'outputWordCount', 'outputParaCount');
-            }
-        });
+                if (contextText) {
+                    contextText.value = button.dataset.context || '';
+                    updateTextStats(contextText.value, 'contextCharCount', 'contextWordCount', 'contextParaCount');
+                }
+                
+                if (inputText) {
+                    inputText.value = button.dataset.text || '';
+                    updateTextStats(inputText.value, 'inputCharCount', 'inputWordCount', 'inputParaCount');
+                }
+                
+                function setActiveButton(groupId, value) {
+                    const buttons = document.querySelectorAll(`#${groupId} .btn`);
+                    buttons.forEach(btn => {
+                        if (btn.dataset.value === value) {
+                            btn.classList.add('active');
+                        } else {
+                            btn.classList.remove('active');
+                        }
+                    });
+                }
+                
+                setActiveButton('toneGroup', button.dataset.tone);
+                setActiveButton('formatGroup', button.dataset.format);
+                setActiveButton('lengthGroup', button.dataset.length);
+            }, 150); // Short delay to ensure tab is fully shown
+        }
+        
+        const outputText = document.getElementById('outputText');
+        if (outputText) {
+            outputText.value = '';
+            updateTextStats('', 'outputCharCount', 'outputWordCount', 'outputParaCount');
+        }
     });
 
-    document.querySelectorAll('.reuse-email').forEach(button => {
-        button.addEventListener('click', function(e) {
-            e.preventDefault();
-            
-            const emailTab = document.querySelector('#email-tab');
-            if (emailTab) {
-                const tab = new bootstrap.Tab(emailTab);
-                tab.show();
-            }
+    // Delegated so that lazily loaded history entries are handled too
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.reuse-email');
+        if (!button) return;
+        e.preventDefault();
+        
+        const emailTab = document.querySelector('#email-tab');
+        if (emailTab) {
+            const tab = new bootstrap.Tab(emailTab);
+            tab.show();
+        }
 
-            const emailType = document.getElementById('emailType');
-            const emailContent = document.getElementById('emailContent');
-            const emailSender = document.getElementById('emailSender');
-            const emailSubject = document.getElementById('emailSubject');
-            const emailOutput = document.getElementById('emailOutput');
-            
-            if (emailType) emailType.value = this.dataset.type || '';
-            if (emailContent) emailContent.value = this.dataset.content || '';
-            if (emailSender) emailSender.value = this.dataset.sender || '';
-            if (emailSubject) emailSubject.value = '';
-            if (emailOutput) emailOutput.value = '';
-        });
+        const emailType = document.getElementById('emailType');
+        const emailContent = document.getElementById('emailContent');
+        const emailSender = document.getElementById('emailSender');
+        const emailSubject = document.getElementById('emailSubject');
+        const emailOutput = document.getElementById('emailOutput');
+        
+        if (emailType) emailType.value = button.dataset.type || '';
+        if (emailContent) emailContent.value = button.dataset.content || '';
+        if (emailSender) emailSender.value = button.dataset.sender || '';
+        if (emailSubject) emailSubject.value = '';
+        if (emailOutput) emailOutput.value = '';
     });
 
     const resetHistory = document.getElementById('resetHistory');
@@ -558,34 +626,19 @@ document.addEventListener('DOMContentLoaded', function() {
 
             try {
                 const useEmojis = document.getElementById('useEmojis').checked;
-                const response = await fetch('/api/reformulate', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        context: context,
-                        text: text,
-                        tone: tone,
-                        format: format,
-                        length: length,
-                        use_emojis: useEmojis
-                    })
+                const result = await streamGeneration('/api/reformulate', {
+                    context: context,
+                    text: text,
+                    tone: tone,
+                    format: format,
+                    length: length,
+                    use_emojis: useEmojis
+                }, partial => {
+                    outputText.value = partial;
                 });
 
-                if (!response.ok) {
-                    const errorText = await response.text();
-                    try {
-                        const errorData = JSON.parse(errorText);
-                        throw new Error(errorData.error || 'Une erreur est survenue');
-                    } catch (e) {
-                        throw new Error('Erreur de communication avec le serveur');
-                    }
-                }
-
-                const data = await response.json();
-                outputText.value = data.text;
-                updateTextStats(data.text, 'outputCharCount', 'outputWordCount', 'outputParaCount');
+                outputText.value = result;
+                updateTextStats(result, 'outputCharCount', 'outputWordCount', 'outputParaCount');
                 showAlert("Reformulation terminée avec succès!", "success", 3000);
             } catch (error) {
                 console.error('Erreur:', error);
@@ -859,24 +912,16 @@ document.querySelectorAll('.language-btn').forEach(button => {
         this.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Traduction...';
 
         try {
-            const response = await fetch('/api/translate', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    text: inputText,
-                    language: this.dataset.lang
-                })
+            const translationOutput = document.getElementById('translationOutput');
+            const result = await streamGeneration('/api/translate', {
+                text: inputText,
+                language: this.dataset.lang
+            }, partial => {
+                translationOutput.value = partial;
             });
 
-            if (!response.ok) {
-                throw new Error('Erreur de traduction');
-            }
-
-            const data = await response.json();
-            document.getElementById('translationOutput').value = data.text;
-            updateTextStats(data.text, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
+            translationOutput.value = result;
+            updateTextStats(result, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
             showAlert('Traduction terminée !', 'success');
         } catch (error) {
             console.error('Erreur:', error);
@@ -84,13 +84,19 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(`Model select element not found for ${provider}`);
             }
             modelSelect.innerHTML = '<option value="">Loading models...</option>';
-            let url = `/api/models/${provider}`;
+            const params = new URLSearchParams();
             if (provider === 'ollama') {
                 const ollamaUrlInput = document.getElementById('ollamaUrl');
                 if (ollamaUrlInput && ollamaUrlInput.value) {
-                    url += `?url=${encodeURIComponent(ollamaUrlInput.value)}`;
+                    params.set('url', ollamaUrlInput.value);
                 }
             }
+            // An explicit refresh bypasses the server-side model cache
+            if (button) {
+                params.set('refresh', '1');
+            }
+            const query = params.toString();
+            const url = `/api/models/${provider}${query ? `?${query}` : ''}`;
             const response = await fetch(url);
             const data = await response.json();
             if (!response.ok) {
@@ -28,24 +28,16 @@ document.addEventListener('DOMContentLoaded', function() {
             translateText.textContent = 'En cours...';
 
             try {
-                const response = await fetch('/api/translate', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        text: text,
-                        language: getSelectedLanguage()
-                    })
+                translationOutput.value = '';
+                const result = await streamGeneration('/api/translate', {
+                    text: text,
+                    language: getSelectedLanguage()
+                }, partial => {
+                    translationOutput.value = partial;
                 });
 
-                const data = await response.json();
-                if (data.error) {
-                    translationOutput.value = `Erreur: ${data.error}`;
-                } else {
-                    translationOutput.value = data.text;
-                    updateTextStats(translationOutput.value, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
-                }
+                translationOutput.value = result;
+                updateTextStats(translationOutput.value, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
             } catch (error) {
                 translationOutput.value = `Erreur: ${error.message}`;
             } finally {
@@ -89,40 +81,41 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Handle reuse translation button
-    document.querySelectorAll('.reuse-translation').forEach(button => {
-        button.addEventListener('click', function(e) {
-            e.preventDefault();
-            e.stopPropagation();
+    // Delegated so that lazily loaded history entries are handled too
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.reuse-translation');
+        if (!button) return;
+        e.preventDefault();
+        e.stopPropagation();
+        
+        const translationTab = document.querySelector('#translation-tab');
+        if (translationTab) {
+            translationTab.click();
             
-            const translationTab = document.querySelector('#translation-tab');
-            if (translationTab) {
-                translationTab.click();
+            // Wait for the tab transition
+            setTimeout(() => {
+                const translationInput = document.getElementById('translationInput');
+                if (translationInput) {
+                    translationInput.value = button.dataset.text || '';
+                    updateTextStats(translationInput.value, 'translationInputCharCount', 'translationInputWordCount', 'translationInputParaCount');
+                }
                 
-                // Wait for the tab transition
-                setTimeout(() => {
-                    const translationInput = document.getElementById('translationInput');
-                    if (translationInput) {
-                        translationInput.value = this.dataset.text || '';
-                        updateTextStats(translationInput.value, 'translationInputCharCount', 'translationInputWordCount', 'translationInputParaCount');
-                    }
-                    
-                    // Set target language if it exists
-                    const languageSelect = document.getElementById('targetLanguage');
-                    if (languageSelect && this.dataset.targetLanguage) {
-                        const option = Array.from(languageSelect.options).find(opt => opt.value === this.dataset.targetLanguage);
-                        if (option) {
-                            languageSelect.value = this.dataset.targetLanguage;
-                        }
+                // Set target language if it exists
+                const languageSelect = document.getElementById('targetLanguage');
+                if (languageSelect && button.dataset.targetLanguage) {
+                    const option = Array.from(languageSelect.options).find(opt => opt.value === button.dataset.targetLanguage);
+                    if (option) {
+                        languageSelect.value = button.dataset.targetLanguage;
                     }
-                    
-                    // Reset translation output
-                    const translationOutput = document.getElementById('translationOutput');
-                    if (translationOutput) {
-                        translationOutput.value = '';
-                        updateTextStats(translationOutput.value, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
-                    }
-                }, 150);
-            }
-        });
+                }
+                
+                // Reset translation output
+                const translationOutput = document.getElementById('translationOutput');
+                if (translationOutput) {
+                    translationOutput.value = '';
+                    updateTextStats(translationOutput.value, 'translationOutputCharCount', 'translationOutputWordCount', 'translationOutputParaCount');
+                }
+            }, 150);
+        }
     });
 });
@@ -1,10 +1,11 @@
-const CACHE_NAME = 'reformulateur-v1';
+const CACHE_NAME = 'reformulateur-v4';
 const ASSETS = [
     '/',
     '/static/css/style.css',
     '/static/js/main.js',
     '/static/js/settings.js',
     '/static/js/translation.js',
+    '/static/js/history.js',
     '/static/manifest.json',
     'https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css',
     'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'
@@ -17,6 +18,14 @@ self.addEventListener('install', event => {
     );
 });
 
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys().then(keys => Promise.all(
+            keys.filter(key => key !== CACHE_NAME).map(key => caches.delete(key))
+        ))
+    );
+});
+
 self.addEventListener('fetch', event => {
     event.respondWith(
         caches.match(event.request)
@@ -0,0 +1,216 @@
+"""Opt-in, request-scoped tracing.
+
+With tracing on, each request gets a trace whose spans time its stages:
+JSON parsing, preferences, prompt building, provider queue and call, history
+submission. Finished traces are appended to a file as OpenTelemetry (OTLP/JSON)
+``ExportTraceServiceRequest`` lines, and a ``Server-Timing`` header shows the
+breakdown in the browser devtools.
+
+The current span lives in a context variable. When no trace was started,
+``span()`` and ``record()`` return after a single lookup, so disabled tracing
+costs nothing measurable. Work handed to other threads keeps its parent span
+through ``bind()``.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+_current = contextvars.ContextVar('tracing_span', default=None)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'kind', 'start_ns',
+                 'end_ns', 'attributes', '_token')
+
+    def __init__(self, trace, name, parent_id, kind=SPAN_KIND_INTERNAL,
+                 start_ns=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+        self.trace.add(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc is not None:
+            self.attributes['error'] = f"{type(exc).__name__}: {exc}"
+        self.end()
+        return False
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes)
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if 'error' in self.attributes:
+            span["status"] = {"code": 2, "message": self.attributes['error']}
+        return span
+
+
+class Trace:
+    """The spans of one request; spans may end on other threads."""
+
+    def __init__(self, name, attributes):
+        self.trace_id = os.urandom(16).hex()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.root = Span(self, name, None, SPAN_KIND_SERVER,
+                         attributes=attributes)
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def server_timing(self):
+        """``Server-Timing`` value: finished stages, summed by name, and total."""
+        durations = {}
+        with self._lock:
+            for span in self.spans:
+                if span is not self.root:
+                    durations[span.name] = (durations.get(span.name, 0.0)
+                                            + span.duration_ms)
+        durations['total'] = self.root.duration_ms
+        return ', '.join(f"{name};dur={duration:.2f}"
+                         for name, duration in durations.items())
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+
+def span(name, **attributes):
+    """Context manager timing ``name`` as a child of the current span."""
+    parent = _current.get()
+    if parent is None:
+        return NOOP
+    return Span(parent.trace, name, parent.span_id, attributes=attributes)
+
+
+def record(name, seconds, **attributes):
+    """Add a finished child span of ``seconds`` ending now (e.g. a queue wait)."""
+    parent = _current.get()
+    if parent is None:
+        return
+    end_ns = time.time_ns()
+    Span(parent.trace, name, parent.span_id,
+         start_ns=end_ns - int(seconds * 1e9),
+         attributes=attributes).end(end_ns)
+
+
+def bind(function):
+    """``function`` running under the current span, for use on another thread."""
+    if _current.get() is None:
+        return function
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+class Tracer:
+    """Starts request traces and exports them once finished.
+
+    ``sample_rate`` is the fraction of requests traced; ``path`` is the OTLP
+    JSON lines file, or None to only send ``Server-Timing`` headers.
+    """
+
+    def __init__(self, enabled=False, path=None, server_timing=True,
+                 sample_rate=1.0, service_name='reformulator'):
+        self.enabled = enabled
+        self.path = path
+        self.server_timing = server_timing
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def start(self, name, **attributes):
+        """Start a trace for the current request; returns its root span or None."""
+        if not self.enabled:
+            return None
+        root = None
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            root = Trace(name, attributes).root
+        # Server threads are reused: never inherit the previous request's trace
+        _current.set(root)
+        return root
+
+    def finish(self, root, **attributes):
+        _current.set(None)
+        root.set(**attributes)
+        root.end()
+        if self.path:
+            self._export(root.trace)
+
+    def _export(self, trace):
+        with trace._lock:
+            spans = [span.to_otlp() for span in trace.spans]
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes(
+                {"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "reformulator"},
+                            "spans": spans}]
+        }]})
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Error writing trace: {str(e)}")